@@ -0,0 +1,69 @@
+"""Per-poll cost of the distance filter at feed scale.
+
+    python benchmarks/bench_geo.py [--features 100000] [--max-mi 100]
+
+Compares the old per-feature km_between loop with GeoFilter.within, cold (first poll) and
+warm (coordinates unchanged since the previous poll, served from the memo).
+"""
+
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sources.geo import GeoFilter, km_between  # noqa: E402
+
+LAT0, LON0 = 37.4419, -122.1430
+
+
+def scalar_filter(lats, lons, max_mi):
+    out = []
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        d = km_between(LAT0, LON0, lat, lon) / 1.609344
+        if d <= max_mi:
+            out.append((i, d))
+    return out
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--features", type=int, default=100_000)
+    ap.add_argument("--max-mi", type=float, default=100.0)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    # Roughly the shape of all_day.geojson: worldwide, with a cluster near the origin.
+    lats, lons = [], []
+    for i in range(args.features):
+        if i % 50 == 0:
+            lats.append(LAT0 + rng.uniform(-2, 2))
+            lons.append(LON0 + rng.uniform(-2, 2))
+        else:
+            lats.append(rng.uniform(-80, 80))
+            lons.append(rng.uniform(-180, 180))
+
+    t_scalar, ref = timed(lambda: scalar_filter(lats, lons, args.max_mi), args.repeat)
+    t_cold, _ = timed(lambda: GeoFilter(LAT0, LON0, args.max_mi).within(lats, lons), args.repeat)
+    warm = GeoFilter(LAT0, LON0, args.max_mi)
+    warm.within(lats, lons)
+    t_warm, got = timed(lambda: warm.within(lats, lons), args.repeat)
+
+    assert [i for i, _ in got] == [i for i, _ in ref], "GeoFilter disagrees with km_between"
+    print(f"{args.features} features, {len(ref)} within {args.max_mi} mi")
+    print(f"  scalar km_between loop : {t_scalar * 1000:8.2f} ms/poll")
+    print(f"  GeoFilter (cold)       : {t_cold * 1000:8.2f} ms/poll")
+    print(f"  GeoFilter (warm memo)  : {t_warm * 1000:8.2f} ms/poll")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""WS-5000 decode throughput over replayed payloads.
+
+    python benchmarks/bench_ws5000_decode.py [--payloads 20000] [--replay FILE]
+
+Replays station pushes (synthetic by default, or one recorded query string / payload per
+line of FILE) through WS5000Decoder and reports messages per second for field parsing on
+the fast path and on the robust fallback, and for the full decode.  Both parsers must agree
+on every payload.
+"""
+
+import argparse, os, sys, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+from util.ws5000_decode import WS5000Decoder  # noqa: E402
+
+
+def rate(fn, payloads, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for raw in payloads:
+            fn(raw)
+        best = min(best, time.perf_counter() - t0)
+    return len(payloads) / best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--payloads", type=int, default=20_000)
+    ap.add_argument("--replay", help="file with one recorded payload per line")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.replay:
+        with open(args.replay, "rb") as f:
+            payloads = [line.rstrip(b"\r\n") for line in f if line.strip()]
+    else:
+        payloads = [q.encode("ascii") for q in fixtures.ws5000_queries(args.payloads)]
+
+    decoder = WS5000Decoder({}, lambda dt: dt.isoformat())
+    fast = sum(decoder._fast_fields(raw) is not None for raw in payloads)
+    for raw in payloads:
+        assert decoder.parse_fields(raw) == decoder._parse_fields_robust(raw), raw
+
+    print(f"{len(payloads)} payloads, {fast} on the fast path")
+    for label, fn in (
+        ("parse, robust path ", decoder._parse_fields_robust),
+        ("parse_fields       ", decoder.parse_fields),
+        ("decode (parse+norm)", decoder.decode),
+    ):
+        print(f"  {label}: {rate(fn, payloads, args.repeat):10.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
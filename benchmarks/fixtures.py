@@ -0,0 +1,185 @@
+"""Synthetic feed bodies shaped like the real upstream responses.
+
+Every generator is seeded so two runs (or two commits) benchmark byte-identical input.
+`near` items are placed inside the default radius around ORIGIN; the rest are scattered
+across the western US so the location filters have realistic work to reject.
+"""
+
+import json, random
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+ORIGIN = (37.4419, -122.1430)
+
+CHP_PHRASES = [
+    "2 VEHS BLKG #2 LN NB",
+    "TC NO DETAILS",
+    "VEH STALLED IN CD, RP ADVSD",
+    "DEBRIS IN LNS, 1141 ENRT",
+    "MC DOWN ON RS, UNK INJ",
+    "TRFC BACKED UP TO OFR, SIG ALERT ISSUED",
+    "WB 280 JSO PAGE MILL RD",
+    "CT ADVSD ON SCENE FOR CLEANUP",
+]
+
+
+def _scatter(rng, i, near):
+    if i < near:
+        return ORIGIN[0] + rng.uniform(-0.05, 0.05), ORIGIN[1] + rng.uniform(-0.05, 0.05)
+    return rng.uniform(32.5, 42.0), rng.uniform(-124.4, -114.1)
+
+
+def caltrans_description(rng, ts: datetime) -> str:
+    lines = [
+        f"{(ts + timedelta(minutes=5 * k)).strftime('%b %d %Y %I:%M%p')} "
+        f"[{k + 1}] {rng.choice(CHP_PHRASES)}"
+        for k in range(rng.randint(2, 6))
+    ]
+    return (
+        f"<p><b>Incident {rng.randint(100000, 999999)}</b></p>"
+        f'<p align="left">{"<br/>".join(lines)}</p>'
+        f'<p class="update-stamp">Updated {ts.strftime("%m/%d/%Y %I:%M%p").lower()}</p>'
+        "<p>Information courtesy of the California Highway Patrol</p>"
+    )
+
+
+def caltrans_kml(n: int, near: int = 50, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    base = datetime(2026, 10, 17, 8, 0)
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>lcs</name><Folder>'
+    ]
+    for i in range(n):
+        lat, lon = _scatter(rng, i, near)
+        desc = caltrans_description(rng, base + timedelta(minutes=rng.randint(0, 600)))
+        parts.append(
+            f"<Placemark><name>Incident {i}</name><styleUrl>#s{i % 7}</styleUrl>"
+            f"<description><![CDATA[{desc}]]></description>"
+            f"<Point><coordinates>{lon:.6f},{lat:.6f},0</coordinates></Point></Placemark>"
+        )
+    parts.append("</Folder></Document></kml>")
+    return "".join(parts).encode("utf-8")
+
+
+def usgs_geojson(n: int, near: int = 20, seed: int = 2) -> bytes:
+    rng = random.Random(seed)
+    t0 = int(datetime(2026, 10, 17, tzinfo=timezone.utc).timestamp() * 1000)
+    feats = []
+    for i in range(n):
+        lat, lon = _scatter(rng, i, near)
+        mag = round(rng.uniform(-0.5, 4.5), 2)
+        feats.append(
+            {
+                "type": "Feature",
+                "id": f"nc{70000000 + i}",
+                "properties": {
+                    "mag": mag,
+                    "place": f"{rng.randint(1, 30)} km NW of Somewhere, CA",
+                    "time": t0 + i * 1000,
+                    "updated": t0 + i * 1000 + 60000,
+                    "url": f"https://earthquake.usgs.gov/earthquakes/eventpage/nc{70000000 + i}",
+                    "status": "automatic",
+                    "tsunami": 0,
+                    "sig": int(max(mag, 0) * 100),
+                    "net": "nc",
+                    "magType": "md",
+                    "type": "earthquake",
+                    "title": f"M {mag} - Somewhere, CA",
+                },
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [round(lon, 4), round(lat, 4), round(rng.uniform(0, 20), 2)],
+                },
+            }
+        )
+    return json.dumps(
+        {"type": "FeatureCollection", "metadata": {"count": n}, "features": feats}
+    ).encode("utf-8")
+
+
+def nws_alerts(n: int, seed: int = 3) -> bytes:
+    rng = random.Random(seed)
+    events = ["Wind Advisory", "Heat Advisory", "Dense Fog Advisory", "Red Flag Warning"]
+    feats = []
+    for i in range(n):
+        event = rng.choice(events)
+        feats.append(
+            {
+                "id": f"https://api.weather.gov/alerts/urn:oid:2.49.0.1.840.0.{i:040x}",
+                "type": "Feature",
+                "geometry": None,
+                "properties": {
+                    "id": f"urn:oid:2.49.0.1.840.0.{i:040x}",
+                    "areaDesc": "Santa Clara Valley Including San Jose; San Mateo Coast",
+                    "sent": "2026-10-17T08:00:00-07:00",
+                    "effective": "2026-10-17T08:00:00-07:00",
+                    "expires": "2026-10-17T20:00:00-07:00",
+                    "status": "Actual",
+                    "messageType": "Alert",
+                    "severity": rng.choice(["Minor", "Moderate", "Severe"]),
+                    "certainty": "Likely",
+                    "urgency": "Expected",
+                    "event": event,
+                    "senderName": "NWS San Francisco CA",
+                    "headline": f"{event} issued October 17 at 8:00AM PDT by NWS San Francisco CA",
+                    "description": "* WHAT...Conditions expected. " * 20,
+                    "instruction": "Use caution. " * 10,
+                },
+            }
+        )
+    return json.dumps({"type": "FeatureCollection", "features": feats}).encode("utf-8")
+
+
+def pao_html(n: int, seed: int = 4) -> bytes:
+    rng = random.Random(seed)
+    cards = []
+    for i in range(n):
+        slug = f"2026/10/17/story-{i}-{rng.randint(1000, 9999)}"
+        cards.append(
+            f'<article class="card"><a href="/news/{slug}" class="card-link">'
+            f'<div class="img"><img src="/img/{i}.jpg" alt=""></div>'
+            f"<h3>Story {i}: council weighs plan for {rng.choice(['housing', 'rail', 'parks'])}"
+            f"</h3></a><p class='dek'>{'Lorem ipsum dolor sit amet. ' * 8}</p></article>"
+        )
+    nav = "".join(f'<a href="/section/{k}">Section {k}</a>' for k in range(40))
+    return (
+        "<!DOCTYPE html><html><head><title>News</title></head><body>"
+        f"<nav>{nav}</nav><main>{''.join(cards)}</main><footer>Palo Alto Online</footer>"
+        "</body></html>"
+    ).encode("utf-8")
+
+
+def ws5000_queries(n: int, seed: int = 5):
+    """Query strings as the WS-5000 console pushes them (one per reading)."""
+    rng = random.Random(seed)
+    t = datetime(2026, 10, 17, 15, 0, tzinfo=timezone.utc)
+    out = []
+    for i in range(n):
+        out.append(
+            urlencode(
+                {
+                    "PASSKEY": "0123456789ABCDEF",
+                    "stationtype": "AMBWeatherPro_V5.1.6",
+                    "dateutc": (t + timedelta(seconds=16 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+                    "tempinf": f"{rng.uniform(68, 74):.1f}",
+                    "humidityin": rng.randint(35, 50),
+                    "baromrelin": f"{rng.uniform(29.8, 30.1):.3f}",
+                    "baromabsin": f"{rng.uniform(29.7, 30.0):.3f}",
+                    "tempf": f"{rng.uniform(50, 80):.1f}",
+                    "humidity": rng.randint(30, 95),
+                    "winddir": rng.randint(0, 359),
+                    "windspeedmph": f"{rng.uniform(0, 15):.1f}",
+                    "windgustmph": f"{rng.uniform(0, 25):.1f}",
+                    "maxdailygust": "18.3",
+                    "hourlyrainin": "0.000",
+                    "eventrainin": "0.000",
+                    "dailyrainin": "0.000",
+                    "rainratein": "0.000",
+                    "solarradiation": f"{rng.uniform(0, 800):.2f}",
+                    "uv": rng.randint(0, 8),
+                    "battout": 1,
+                }
+            )
+        )
+    return out
@@ -0,0 +1,345 @@
+"""End-to-end poll benchmarks against synthetic feeds and a stub Mattermost server.
+
+    python benchmarks/run_benchmarks.py                      # every scenario, default sizes
+    python benchmarks/run_benchmarks.py -s caltrans --size caltrans=10000,200000
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<old>.json
+
+Feeds are served by benchmarks/stubs.FeedServer and posts go through the real Notifier and
+mattermostdriver to stubs.StubMattermost.  Each scenario runs in its own subprocess so
+peak RSS is per scenario.  A cold poll starts from an empty seen store and no cached
+validators; `unchanged_ms` is one more poll once the feed is cached (the 304 path).
+
+Results are written to benchmarks/results/<commit>.json.
+"""
+
+import argparse, json, math, os, socket, subprocess, sys, tempfile, time
+import http.client
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+from stubs import TEAM, USER, FeedServer, StubMattermost  # noqa: E402
+
+DEFAULT_SIZES = {
+    "nws": [200],
+    "usgs": [10000],
+    "caltrans": [10000, 50000, 200000],
+    "pao": [500],
+    "ws5000": [2000],
+}
+
+ACRONYMS = {
+    "ADVSD": "advised",
+    "BLKG": "blocking",
+    "CD": "center divider",
+    "CT": "Caltrans",
+    "ENRT": "en route",
+    "INJ": "injuries",
+    "JSO": "just south of",
+    "LN": "lane",
+    "LNS": "lanes",
+    "MC": "motorcycle",
+    "NB": "northbound",
+    "OFR": "offramp",
+    "RP": "reporting party",
+    "RS": "right shoulder",
+    "TC": "traffic collision",
+    "TRFC": "traffic",
+    "UNK": "unknown",
+    "VEH": "vehicle",
+    "VEHS": "vehicles",
+    "WB": "westbound",
+}
+
+# scenario -> (module, class, fixture path, content type, fixture function)
+SCENARIOS = {
+    "nws": ("sources.nws", "NWS", "/alerts/active", "application/geo+json", fixtures.nws_alerts),
+    "usgs": (
+        "sources.usgs",
+        "USGS",
+        "/summary/all_day.geojson",
+        "application/geo+json",
+        fixtures.usgs_geojson,
+    ),
+    "caltrans": (
+        "sources.caltrans",
+        "Caltrans",
+        "/lcs.kml",
+        "application/vnd.google-earth.kml+xml",
+        fixtures.caltrans_kml,
+    ),
+    "pao": ("sources.pao", "PAO", "/news/", "text/html", fixtures.pao_html),
+    "ws5000": ("sources.ambient_weather", "AmbientWeather", None, None, None),
+}
+
+
+def source_cfg(scenario: str, size: int, url: str, port: int = 0) -> dict:
+    notifier = {"type": "mattermost", "stream": True, "channel": scenario}
+    if scenario == "nws":
+        params = {"api_url": url}
+    elif scenario == "usgs":
+        params = {"feed_url": url, "max_mi": 100, "ignore_magnitude_below": 1.0}
+    elif scenario == "caltrans":
+        params = {"max_mi": 10, "endpoints": {"lcs": url}}
+    elif scenario == "pao":
+        params = {"news_url": url, "max_items": size}
+    else:
+        return {
+            "mode": "http",
+            "http": {"host": "127.0.0.1", "port": port},
+            "params": {},
+            "notifier": notifier,
+        }
+    return {"params": params, "acronyms": ACRONYMS, "notifier": notifier}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss survives execve on Linux, so a child would report the parent's peak;
+    # VmHWM belongs to the new address space.
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def api_calls(mm_base: str) -> int:
+    with urllib.request.urlopen(f"{mm_base}/_bench/calls") as r:
+        return json.load(r).get("total", 0)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def push_readings(port: int, queries) -> float:
+    """Send each reading the way the console does; returns the elapsed seconds."""
+    deadline = time.time() + 5
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+    start = time.perf_counter()
+    for q in queries:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", f"/data/report/?{q}")
+        conn.getresponse().read()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def run_child(spec: dict) -> dict:
+    """Runs inside the scenario subprocess."""
+    import importlib, logging
+    from mattermostdriver import Driver
+    from util import http as http_util
+    from util.notifier import Notifier
+    from util.parse_pool import parse_pool
+    from util.seen_store import SeenStore
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    logger = logging.getLogger("bench")
+    parse_pool.configure({"workers": spec.get("parse_workers", 0)}, logger)
+    scenario, size, repeat = spec["scenario"], spec["size"], spec["repeat"]
+    module, cls_name = SCENARIOS[scenario][:2]
+    cls = getattr(importlib.import_module(module), cls_name)
+    driver = Driver(spec["mattermost"])
+    driver.login()
+    general = {
+        "location": {"lat": fixtures.ORIGIN[0], "lon": fixtures.ORIGIN[1]},
+        "timezone": "America/Los_Angeles",
+        "user_agent": "mattermost-newsfeeds-bench",
+        "mattermost": {"team": TEAM["display_name"], "user": USER["username"]},
+    }
+    port = free_port() if scenario == "ws5000" else 0
+    cfg = source_cfg(scenario, size, spec.get("url"), port)
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    queries = fixtures.ws5000_queries(size) if scenario == "ws5000" else None
+
+    def build(seen):
+        notifier = Notifier(general, cfg["notifier"], driver, logger)
+        return cls(scenario, general, cfg, seen, logger, notifier)
+
+    baseline_rss = peak_rss_mb()
+    latencies, posted, calls, ingest = [], [], [], []
+    source = None
+    for i in range(repeat):
+        seen = SeenStore(os.path.join(tmp, f"seen-{i}.db"), logger=logger)
+        http_util.validators.entries.clear()
+        if source is None or scenario != "ws5000":
+            source = build(seen)
+        source.seen = seen
+        if queries:
+            ingest.append(push_readings(port, queries))
+        before = api_calls(spec["mattermost_base"])
+        start = time.perf_counter()
+        n = source.poll(time.time())
+        seen.commit()
+        latencies.append(time.perf_counter() - start)
+        calls.append(api_calls(spec["mattermost_base"]) - before)
+        posted.append(n if scenario != "ws5000" else 1)
+        if i < repeat - 1 or scenario == "ws5000":
+            seen.close()
+    unchanged_ms = None
+    if scenario != "ws5000":
+        start = time.perf_counter()
+        source.poll(time.time())
+        unchanged_ms = round((time.perf_counter() - start) * 1000, 2)
+        seen.close()
+    parse_pool.shutdown()
+
+    p50 = percentile(latencies, 50)
+    result = {
+        "scenario": scenario,
+        "size": size,
+        "repeat": repeat,
+        "items_per_sec": round(size / p50, 1),
+        "p50_ms": round(p50 * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "unchanged_ms": unchanged_ms,
+        "posted_per_poll": round(sum(posted) / len(posted), 1),
+        "api_calls_per_poll": round(sum(calls) / len(calls), 1),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if ingest:
+        result["ingest_per_sec"] = round(size / percentile(ingest, 50), 1)
+    return result
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+
+    sha = git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    return sha, dirty
+
+
+def compare(old_path: str, results):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {old_path}")
+    print(f"{'scenario':<10}{'size':>8}{'p50 ms':>12}{'delta':>9}{'items/s':>12}{'delta':>9}")
+    for r in results:
+        o = old.get((r["scenario"], r["size"]))
+        if not o:
+            continue
+        d_lat = (r["p50_ms"] / o["p50_ms"] - 1) * 100 if o["p50_ms"] else 0.0
+        d_ips = (r["items_per_sec"] / o["items_per_sec"] - 1) * 100 if o["items_per_sec"] else 0.0
+        print(
+            f"{r['scenario']:<10}{r['size']:>8}{r['p50_ms']:>12.1f}{d_lat:>+8.0f}%"
+            f"{r['items_per_sec']:>12.0f}{d_ips:>+8.0f}%"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS))
+    ap.add_argument(
+        "--size",
+        action="append",
+        default=[],
+        metavar="SCENARIO=N[,N]",
+        help="override the fixture sizes for a scenario",
+    )
+    ap.add_argument("--repeat", type=int, default=5, help="cold polls per scenario")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="stub Mattermost delay")
+    ap.add_argument(
+        "--parse-workers", type=int, default=0, help="parse pool size (0: parse in-process)"
+    )
+    ap.add_argument("--out", default=os.path.join(HERE, "results"))
+    ap.add_argument("--compare", metavar="RESULTS_JSON")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    sizes = {k: list(v) for k, v in DEFAULT_SIZES.items()}
+    for override in args.size:
+        name, _, values = override.partition("=")
+        sizes[name] = [int(v) for v in values.split(",") if v]
+    scenarios = args.scenario or list(SCENARIOS)
+
+    feeds = FeedServer()
+    mattermost = StubMattermost(channels=scenarios, latency=args.latency_ms / 1000)
+    results = []
+    for scenario in scenarios:
+        path, ctype, make = SCENARIOS[scenario][2:]
+        for size in sizes[scenario]:
+            spec = {
+                "scenario": scenario,
+                "size": size,
+                "repeat": args.repeat,
+                "parse_workers": args.parse_workers,
+                "url": feeds.add(path, make(size), ctype) if make else None,
+                "mattermost": mattermost.driver_options(),
+                "mattermost_base": mattermost.base,
+            }
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{scenario} {size}: failed\n{proc.stderr}", file=sys.stderr)
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(r)
+            print(
+                f"{scenario:<10}{size:>8}  p50 {r['p50_ms']:>9.1f} ms  p99 {r['p99_ms']:>9.1f} ms"
+                f"  {r['items_per_sec']:>10.0f} items/s  rss {r['peak_rss_mb']:>6.1f} MB"
+                f"  api/poll {r['api_calls_per_poll']:>6.1f}"
+            )
+    feeds.close()
+    mattermost.close()
+
+    sha, dirty = git_revision()
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"{sha}{'-dirty' if dirty else ''}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": sha,
+                "dirty": dirty,
+                "python": sys.version.split()[0],
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "repeat": args.repeat,
+                "parse_workers": args.parse_workers,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"wrote {out_path}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Local HTTP stand-ins for the upstream feeds and for Mattermost's /api/v4.
+
+Both run on ThreadingHTTPServer daemon threads bound to 127.0.0.1 on an ephemeral port.
+The Mattermost stub implements just the routes this project calls and counts every call,
+so a benchmark can report API calls per poll.  GET /_bench/calls returns the counters.
+"""
+
+import gzip, hashlib, itertools, json, re, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+USER = {"id": "u1", "username": "bench"}
+TEAM = {"id": "t1", "display_name": "Bench Team", "name": "bench"}
+
+
+class _Server:
+    def __init__(self, handler_cls):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.port = self.httpd.server_address[1]
+        self.base = f"http://127.0.0.1:{self.port}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        owner: FeedServer = self.server.owner
+        entry = owner.files.get(self.path.split("?", 1)[0])
+        if entry is None:
+            self.send_error(404)
+            return
+        body, gz, ctype, etag = entry
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        use_gzip = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        payload = gz if use_gzip else body
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("ETag", etag)
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class FeedServer(_Server):
+    """Serves registered bodies with an ETag (304 on a match) and gzip when accepted."""
+
+    def __init__(self):
+        self.files: Dict[str, Tuple[bytes, bytes, str, str]] = {}
+        super().__init__(_FeedHandler)
+
+    def add(self, path: str, body: bytes, ctype: str) -> str:
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.files[path] = (body, gzip.compress(body, 6), ctype, etag)
+        return self.base + path
+
+
+class _MattermostHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("GET", re.compile(r"^/api/v4/users/me$"), "get_me"),
+        ("GET", re.compile(r"^/api/v4/users/username/[^/]+$"), "get_user_by_username"),
+        ("GET", re.compile(r"^/api/v4/users/[^/]+/teams$"), "get_user_teams"),
+        ("GET", re.compile(r"^/api/v4/teams$"), "get_teams"),
+        ("GET", re.compile(r"^/api/v4/users/[^/]+/teams/[^/]+/channels$"), "get_channels"),
+        ("GET", re.compile(r"^/api/v4/channels/[^/]+/posts$"), "get_posts_for_channel"),
+        ("POST", re.compile(r"^/api/v4/posts$"), "create_post"),
+        ("PUT", re.compile(r"^/api/v4/posts/[^/]+/patch$"), "patch_post"),
+        ("DELETE", re.compile(r"^/api/v4/posts/[^/]+$"), "delete_post"),
+    ]
+
+    def _reply(self, obj, status=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        owner: StubMattermost = self.server.owner
+        path = self.path.split("?", 1)[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if path == "/_bench/calls":
+            with owner.lock:
+                return self._reply(dict(owner.calls))
+        for m, pattern, name in self.ROUTES:
+            if m == method and pattern.match(path):
+                break
+        else:
+            return self._reply({"message": f"no stub for {method} {path}"}, 404)
+        with owner.lock:
+            owner.calls[name] += 1
+            owner.calls["total"] += 1
+        if owner.latency:
+            time.sleep(owner.latency)
+        if name in ("get_me", "get_user_by_username"):
+            return self._reply(USER)
+        if name in ("get_user_teams", "get_teams"):
+            return self._reply([TEAM])
+        if name == "get_channels":
+            return self._reply(
+                [{"id": cid, "display_name": dn} for dn, cid in owner.channels.items()]
+            )
+        if name == "get_posts_for_channel":
+            return self._reply({"order": [], "posts": {}})
+        if name in ("create_post", "patch_post"):
+            post = json.loads(raw or b"{}")
+            if name == "patch_post":
+                post["id"] = path.split("/")[-2]
+            post.setdefault("id", f"p{next(owner.ids)}")
+            return self._reply(post, 201 if name == "create_post" else 200)
+        return self._reply({"status": "OK"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class StubMattermost(_Server):
+    """Just enough of /api/v4 for login, channel resolution and posting.  `latency` adds a
+    fixed delay per call to model a remote server."""
+
+    def __init__(self, channels=(), latency: float = 0.0):
+        self.channels = {name: f"c{i}" for i, name in enumerate(channels, 1)}
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        super().__init__(_MattermostHandler)
+
+    def driver_options(self) -> dict:
+        return {
+            "url": "127.0.0.1",
+            "scheme": "http",
+            "port": self.port,
+            "basepath": "/api/v4",
+            "token": "bench-token",
+        }
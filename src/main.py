@@ -1,6 +1,21 @@
-import argparse, importlib, json, logging, os, time
+import argparse, asyncio, importlib, json, logging, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+# Startup is timed from here, before the heavier imports below.
+STARTED = time.perf_counter()
+
+from util.scheduler import Scheduler
 from util.seen_store import SeenStore
-from util.notifier import Notifier
+from util.notifier import Notifier, deliver_mattermost, deliver_webhook, digests, flush_digests
+from util.outbox import Outbox
+from util.post_ledger import PostLedger
+from util.channel_resolver import ChannelResolver
+from util.http import configure_http
+from util.feed_cache import feed_cache
+from util.metrics import start_metrics_server
+from util.profiling import profiler
+from util.parse_pool import parse_pool
+from util.startup import StartupReport
 from mattermostdriver import Driver
 
 DEFAULT_CFG = "/etc/mattermost-newsfeeds/config.json"
@@ -12,13 +27,51 @@ def build_logger(level: str):
     return logging.getLogger("mattermost-newsfeeds")
 
 
-def load_sources(cfg, logger, seen, mattermost_api):
+def resolve_channels(cfg, logger, mattermost_api) -> ChannelResolver:
+    """Resolve every enabled source's channel in one batch before any Notifier is built."""
+    general = cfg["general"]
+    mm = general.get("mattermost", {})
+    resolver = ChannelResolver(
+        mattermost_api,
+        logger,
+        cache_path=state_path(general.get("channel_cache_path", "state/channels.json")),
+        ttl_seconds=float(general.get("channel_cache_ttl_hours", 24)) * 3600,
+    )
+    wanted = [
+        (sc["notifier"]["channel"], mm.get("team", ""), mm.get("user", ""))
+        for sc in cfg.get("sources", [])
+        if sc.get("enabled", True) and sc.get("notifier", {}).get("channel")
+    ]
+    resolver.resolve_many(wanted)
+    return resolver
+
+
+def enabled_sources(cfg):
+    return [sc for sc in cfg.get("sources", []) if sc.get("enabled", True)]
+
+
+def import_source_modules(cfg):
+    """Import only the modules of enabled sources (and with them their dependencies)."""
+    for source_config in enabled_sources(cfg):
+        importlib.import_module(source_config["module"])
+
+
+def load_sources(cfg, logger, seen, mattermost_api, outbox=None, resolver=None, ledger=None):
+    """Construct every enabled source, concurrently; the list keeps config order.  Sources
+    start due (CleanUp waits one poll_seconds), so the first poll happens as soon as the
+    scheduler runs."""
     general = cfg["general"]
-    out = []
-    for source_config in cfg.get("sources", []):
-        if not source_config.get("enabled", True):
-            continue
-        notifier = Notifier(general, source_config.get("notifier", {}), mattermost_api, logger)
+
+    def build(source_config):
+        notifier = Notifier(
+            general,
+            source_config.get("notifier", {}),
+            mattermost_api,
+            logger,
+            outbox=outbox,
+            resolver=resolver,
+            ledger=ledger,
+        )
         mod = importlib.import_module(source_config["module"])
         cls = getattr(mod, source_config["class"])
         inst = cls(
@@ -29,12 +82,16 @@ def load_sources(cfg, logger, seen, mattermost_api):
             logger,
             notifier,
         )
-        inst.schedule_next()
-        out.append(inst)
         logger.info(
             f"Loaded source: {source_config['name']} (poll {source_config.get('poll_seconds',300)}s)"
         )
-    return out
+        return inst
+
+    enabled = enabled_sources(cfg)
+    if not enabled:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(enabled), 8), thread_name_prefix="startup") as pool:
+        return list(pool.map(build, enabled))
 
 
 def find_config_path(cli_path: str):
@@ -44,31 +101,98 @@ def find_config_path(cli_path: str):
     return cli_path
 
 
-def scheduler_loop(cfg, logger, mattermost_api):
-    seen_path = cfg["general"]["seen_store_path"]
-    if not os.path.isabs(seen_path):
+def state_path(path: str) -> str:
+    if not os.path.isabs(path):
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        seen_path = os.path.abspath(os.path.join(base_dir, seen_path))
-    seen = SeenStore(seen_path, ttl_days=int(cfg["general"].get("seen_ttl_days", 7)))
-    seen.purge_old()
-
-    sources = load_sources(cfg, logger, seen, mattermost_api)
-    sleep_min = int(cfg["general"].get("sleep_min", 1))
-    sleep_max = int(cfg["general"].get("sleep_max", 5))
-    logger.info("Scheduler started.")
-    while True:
-        now = time.time()
-        ran = False
-        for s in sources:
-            if s.due():
-                try:
-                    s.poll(now)
-                except Exception as e:
-                    logger.exception(f"Error polling {s.name}: {e}")
-                s.schedule_next()
-                ran = True
-        time.sleep(sleep_min if ran else sleep_max)
-        seen.purge_old()
+        path = os.path.abspath(os.path.join(base_dir, path))
+    return path
+
+
+def scheduler_loop(cfg, logger, mattermost_api, report: StartupReport = None):
+    report = report or StartupReport(STARTED)
+
+    def timed(name, fn, *args):
+        with report.phase(name):
+            return fn(*args)
+
+    metrics_cfg = cfg["general"].get("metrics", {})
+    if metrics_cfg.get("enabled", False):
+        start_metrics_server(
+            metrics_cfg.get("host", "127.0.0.1"), int(metrics_cfg.get("port", 9464)), logger
+        )
+    seen_path = state_path(cfg["general"]["seen_store_path"])
+    with report.phase("http cache"):
+        configure_http(
+            cache_path=state_path(cfg["general"].get("http_cache_path", "state/http_cache.json"))
+        )
+        feed_cache.configure(ttl_seconds=float(cfg["general"].get("feed_cache_seconds", 30)))
+    with report.phase("seen store"):
+        seen = SeenStore(
+            seen_path,
+            ttl_days=int(cfg["general"].get("seen_ttl_days", 7)),
+            backend=cfg["general"].get("seen_store_backend", "sqlite"),
+            logger=logger,
+        )
+
+    with report.phase("post ledger"):
+        ledger = PostLedger(
+            state_path(cfg["general"].get("post_ledger_path", "state/posts.db")),
+            ttl_days=float(
+                cfg["general"].get("post_ledger_ttl_days", cfg["general"].get("seen_ttl_days", 7))
+            ),
+            logger=logger,
+        )
+
+    outbox_cfg = cfg["general"].get("outbox", {})
+    with report.phase("outbox"):
+        outbox = Outbox(
+            state_path(outbox_cfg.get("path", "state/outbox.db")), logger, outbox_cfg
+        )
+        outbox.register(
+            "mattermost", lambda body: deliver_mattermost(mattermost_api, body, ledger)
+        )
+        outbox.register("webhook", deliver_webhook)
+        outbox.start()
+
+    parse_pool.configure(cfg["general"].get("parse_pool", {}), logger)
+    # Channel lookups are network-bound and module imports CPU-bound, so overlap them; the
+    # startup purge only needs to finish eventually.
+    startup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+    startup.submit(timed, "seen store purge", seen.purge_old)
+    resolving = startup.submit(
+        timed, "resolve channels", resolve_channels, cfg, logger, mattermost_api
+    )
+    startup.submit(timed, "post ledger purge", ledger.purge_old)
+    timed("import source modules", import_source_modules, cfg)
+    resolver = resolving.result()
+    startup.shutdown(wait=False)
+    sources = timed(
+        "construct sources",
+        load_sources,
+        cfg,
+        logger,
+        seen,
+        mattermost_api,
+        outbox,
+        resolver,
+        ledger,
+    )
+    digests.restore(outbox, [s.notifier for s in sources])
+    scheduler = Scheduler(sources, seen, logger, cfg["general"].get("scheduler", {}))
+    scheduler.on_start(report.print)
+    scheduler.add_periodic(1.0, flush_digests)
+    scheduler.add_periodic(60.0, profiler.flush)
+    scheduler.add_periodic(3600.0, ledger.purge_old)
+    scheduler.add_periodic(3600.0, outbox.purge_dead)
+    scheduler.on_stop(lambda: flush_digests(force=True))
+    scheduler.on_stop(lambda: outbox.close(float(outbox_cfg.get("flush_timeout_seconds", 10))))
+    scheduler.on_stop(profiler.flush)
+    scheduler.on_stop(parse_pool.shutdown)
+    try:
+        asyncio.run(scheduler.run())
+    finally:
+        seen.close()
+        ledger.close()
 
 
 def main():
@@ -78,7 +202,24 @@ def main():
         default=DEFAULT_CFG,
         help=f"Path to config file (default: {DEFAULT_CFG})",
     )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile every poll and send from startup (SIGUSR1 toggles it at runtime)",
+    )
+    ap.add_argument(
+        "--profile-dir",
+        default="state/profiles",
+        help="where profiles and memory snapshots are written (default: state/profiles)",
+    )
+    ap.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print how long each startup phase took once the first polls start",
+    )
     args = ap.parse_args()
+    report = StartupReport(STARTED, enabled=args.startup_report)
+    report.phases.append(("module imports", 0.0, time.perf_counter() - STARTED))
     cfg_path = find_config_path(args.config)
     try:
         with open(cfg_path, "r", encoding="utf-8") as f:
@@ -87,6 +228,8 @@ def main():
         print(f"Error loading config {cfg_path}: {e}")
         return
     logger = build_logger(cfg["general"].get("log_level", "DEBUG"))
+    profiler.configure(state_path(args.profile_dir), logger, enabled=args.profile)
+    profiler.install_signal_handlers()
     general_cfg = cfg.get("general", {})
     login_cfg = {
         "url": general_cfg["mattermost"].get("host", ""),
@@ -96,8 +239,9 @@ def main():
         "basepath": general_cfg["mattermost"].get("basepath", "/api/v4").rstrip("/"),
     }
     mattermost_api = Driver(login_cfg)
-    login_response = mattermost_api.login()
-    scheduler_loop(cfg, logger, mattermost_api)
+    with report.phase("mattermost login"):
+        login_response = mattermost_api.login()
+    scheduler_loop(cfg, logger, mattermost_api, report)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,25 @@
 # ambient_weather.py (v2, package-style)
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import json, sys
 from util.ws5000_handler import Handler
-from util.ws5000_decode import WS5000Decoder
+from util.ws5000_decode import MEASUREMENTS, WS5000Decoder
+from util.timeseries import RollingSeries
+from util.rules import describe
 from .base import SourceBase
 from util.notifier import Notifier
 
 
+# Template fields computed over the recent readings; `params.aggregates` replaces them.
+DEFAULT_AGGREGATES = {
+    "peak_gust_10m": {"metric": "wind_gust_mph", "agg": "max", "window_minutes": 10},
+    "avg_wind_10m": {"metric": "wind_mph", "agg": "mean", "window_minutes": 10},
+    "temp_min_24h": {"metric": "temperature_F", "agg": "min", "window_minutes": 1440},
+    "temp_max_24h": {"metric": "temperature_F", "agg": "max", "window_minutes": 1440},
+    "rain_rate_trend_30m": {"metric": "rain_rate_in_hr", "agg": "rate", "window_minutes": 30},
+    "pressure_trend_3h": {"metric": "pressure_in_hg", "agg": "rate", "window_minutes": 180},
+}
+
+
 class AmbientWeather(SourceBase):
 
     def __init__(
@@ -19,42 +32,64 @@ class AmbientWeather(SourceBase):
         notifier: Notifier,
     ) -> None:
         super().__init__(name, general_cfg, cfg, seen, logger, notifier)
-        self.handler = Handler(self.cfg, logger)
-        self.handler.start()
         self.decoder = WS5000Decoder(self.params, self.dt_utc_to_local_str)
+        self.series = RollingSeries(MEASUREMENTS, int(self.params.get("history_size", 8192)))
+        self.aggregate_specs = self.params.get("aggregates", DEFAULT_AGGREGATES)
+        # With rules, only readings that trip one are posted unless asked otherwise.
+        self.post_readings = bool(self.params.get("post_readings", self.rules is None))
+        self.handler = Handler(self.cfg, logger, on_message=self._record)
+        self.handler.start()
+
+    def _record(self, msg: Dict[str, Any]) -> None:
+        # Every reading goes into the series and through the rules, including those a poll
+        # coalesces away; a rule transition is posted straight away.
+        if msg.get("type") == "http":
+            ts = msg["transport"]["ts"]
+        elif msg.get("type") == "udp":
+            ts = msg["ts"]
+            # parsed once here; poll() reuses the fields
+            msg["fields"] = self.decoder.parse_fields(msg.get("payload", b""))
+        else:
+            return
+        values = self.decoder.measurements(msg.get("fields", {}))
+        self.series.append(ts, values)
+        if self.rules is not None:
+            events = self.rules.evaluate(values, ts)
+            if events:
+                self._post_reading(msg.get("fields", {}), alert=describe(events))
+
+    def _post_reading(self, fields: Dict[str, str], alert: Optional[str] = None) -> None:
+        item = self.decoder.normalize_fields(fields)
+        item.update(self.series.aggregates(self.aggregate_specs))
+        if alert:
+            item["alert"] = alert
+        self.post_item(item)
 
     def _pretty(self) -> bool:
-        mode = str(self.cfg.get("mode", "http")).lower()
-        section = self.cfg.get(mode, {}) if isinstance(self.cfg, dict) else {}
-        return bool(section.get("pretty", False))
+        return bool(self.handler._section(self.handler.mode).get("pretty", False))
 
     def poll(self, now_ts: float) -> int:
-        """Drain queued messages.  For the most recent, decode to dict
-        Returns the number of messages processed.
+        """Decode and post the most recent message (unless rules decide what is posted);
+        older ones since the last poll are superseded.  Returns the number of messages
+        received since the last poll.
         """
-        processed = 0
         pretty = self._pretty()
-        last_msg = None
-        while True:
-            msg = self.handler.poll()
-            if not msg:
-                break
-            else:
-                last_msg = msg
-                processed += 1
+        last_msg, processed = self.handler.latest()
         if last_msg:
             if last_msg.get("type") == "http":
-                fields = last_msg.get("fields", {})
-                item = self.decoder.normalize_fields(fields)
-                self.post_item(item)
+                if self.post_readings:
+                    self._post_reading(last_msg.get("fields", {}))
                 sys.stdout.flush()
             elif last_msg.get("type") == "udp":
-                payload = last_msg.get("payload", b"")
-                rec = self.decoder.decode(payload)
+                fields = last_msg.get("fields")
+                if fields is None:
+                    fields = self.decoder.parse_fields(last_msg.get("payload", b""))
+                rec = self.decoder.normalize_fields(fields)
                 rec["_transport"] = last_msg.get("transport", {})
                 self.logger.debug(json.dumps(rec, indent=2 if pretty else None, ensure_ascii=False))
                 sys.stdout.flush()
             else:
                 pass
-        self.logger.info(f"[AmbientWeather] processed {processed} message(s)")
+        dropped = f", {self.handler.dropped} dropped in total" if self.handler.dropped else ""
+        self.logger.info(f"[AmbientWeather] processed {processed} message(s){dropped}")
         return processed
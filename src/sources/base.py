@@ -1,18 +1,33 @@
-from typing import Any, Dict, List
-import math, time
-from util.http import http_get
+from typing import Any, Dict, List, Optional
+import asyncio, inspect, random, threading, time
+from util.http import freshness_seconds, http_get
+from util.feed_cache import feed_cache
 from util.notifier import Notifier
+from util.metrics import registry
+from util.profiling import profiler
+from util.rules import RuleSet, describe
+from .geo import GeoFilter, bounding_box, km_between
 from datetime import datetime, timezone
 import pytz
 
-
-def km_between(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0088
-    p1, p2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
-    return 2 * R * math.asin(math.sqrt(a))
+POLL_SECONDS = registry.histogram(
+    "newsfeeds_poll_duration_seconds", "Wall time of one source poll", ["source"]
+)
+POLL_ERRORS = registry.counter(
+    "newsfeeds_poll_errors_total", "Polls that raised an exception", ["source"]
+)
+ITEMS_PARSED = registry.counter(
+    "newsfeeds_items_parsed_total", "Items parsed out of fetched feeds", ["source"]
+)
+ITEMS_FILTERED = registry.counter(
+    "newsfeeds_items_filtered_total", "Parsed items dropped by location filters", ["source"]
+)
+ITEMS_POSTED = registry.counter(
+    "newsfeeds_items_posted_total", "Items handed to the notifier", ["source"]
+)
+POLL_INTERVAL = registry.gauge(
+    "newsfeeds_poll_interval_seconds", "Delay chosen before the next poll", ["source"]
+)
 
 
 class SourceBase:
@@ -36,24 +51,84 @@ class SourceBase:
         self.params = cfg.get("params", {})
         self.log_time_format = general_cfg.get("log_time_format", "%Y/%m/%d %H:%M:%S")
         self.template = cfg.get("template")
+        self.alert_template = cfg.get("alert_template")
+        self.rules = RuleSet(cfg["rules"]) if cfg.get("rules") else None
         self.seen = seen
         self.logger = logger
         self.notifier = notifier
         self.next_due = 0.0
         self.poll_seconds = max(30, int(cfg.get("poll_seconds", 300)))
+        self.min_poll_seconds = max(
+            30, int(cfg.get("min_poll_seconds", self.poll_seconds // 2))
+        )
+        self.max_poll_seconds = max(
+            self.min_poll_seconds, int(cfg.get("max_poll_seconds", self.poll_seconds * 4))
+        )
+        self.backoff_factor = max(1.0, float(cfg.get("backoff_factor", 2.0)))
+        self.poll_jitter = min(0.5, max(0.0, float(cfg.get("poll_jitter", 0.1))))
+        self.idle_polls = 0
+        self._freshness: Optional[float] = None
+        self._poll_lock = threading.Lock()
         notifier.base = self
 
     def due(self) -> bool:
         return time.time() >= self.next_due
 
-    def schedule_next(self):
-        self.next_due = time.time() + self.poll_seconds
+    def schedule_next(self, new_count: Optional[int] = None):
+        """Pick the next poll time.  Every poll in a row that finds nothing new multiplies
+        the interval by backoff_factor, up to max_poll_seconds; anything new snaps it back
+        to min_poll_seconds.  If the server said its response stays fresh for longer, wait
+        that long (still capped at the max).  Jitter keeps sources from polling in step; the
+        jittered interval is clamped to [min_poll_seconds, max_poll_seconds] (so a source
+        with equal min and max gets none).  new_count None (failed or timed-out poll)
+        leaves the backoff where it was."""
+        if new_count:
+            self.idle_polls = 0
+        elif new_count == 0:
+            self.idle_polls += 1
+        interval = self.min_poll_seconds * self.backoff_factor ** min(self.idle_polls, 32)
+        if self._freshness:
+            interval = max(interval, self._freshness)
+        self._freshness = None
+        interval *= random.uniform(1 - self.poll_jitter, 1 + self.poll_jitter)
+        interval = min(max(interval, self.min_poll_seconds), self.max_poll_seconds)
+        POLL_INTERVAL.set(interval, source=self.name)
+        self.next_due = time.time() + interval
+
+    def _note_freshness(self, r):
+        # With several fetches in one poll, the one that goes stale first wins.  A feed
+        # served from the feed cache has already been fresh for `age` seconds.
+        ttl = max(0.0, (freshness_seconds(r.headers) or 0.0) - getattr(r, "age", 0.0))
+        self._freshness = ttl if self._freshness is None else min(self._freshness, ttl)
+
+    def fetch_feed(self, url: str, headers=None, params=None, **kwargs):
+        """The feed through the shared feed cache, keyed to this source; None means it is
+        unchanged since this source last processed it and there is nothing to parse.  Call
+        remember() on the feed once its items have been handled."""
+        feed = feed_cache.fetch(
+            url,
+            headers=headers,
+            params=params,
+            consumer=self.name,
+            on_response=self._note_freshness,
+            **kwargs,
+        )
+        if feed is None:
+            self.logger.debug(f"[{self.name}] {url} not modified")
+        return feed
+
+    def count_items(self, parsed: int, kept: int = None):
+        """Report how many items a poll parsed and how many survived filtering."""
+        ITEMS_PARSED.inc(parsed, source=self.name)
+        if kept is not None and parsed > kept:
+            ITEMS_FILTERED.inc(parsed - kept, source=self.name)
 
     def fingerprints(self, item: Dict[str, Any]) -> List[str]:
         fid = item.get("id")
         return [f"{self.bucket}|{fid}"] if fid else []
 
     def post(self, payload: Dict[str, Any]):
+        ITEMS_POSTED.inc(len(payload.get("items", [])) or 1, source=self.name)
         self.notifier.send(
             f"{self.name} — {payload.get('count',0)} new",
             payload,
@@ -61,17 +136,85 @@ class SourceBase:
             template=self.template,
         )
 
-    def post_item(self, item: Dict[str, Any]):
+    def check_version(self, identity: str, version: str) -> Optional[str]:
+        """"new", "changed" or None (this version was already reported) for an item that
+        keeps `identity` across updates.  Items first seen before versions were tracked
+        (no `|v` marker) record their version silently rather than being reported again."""
+        marker = f"{identity}|v"
+        versioned = f"{identity}|{version}"
+        if not self.seen.is_seen(self.bucket, identity):
+            self.seen.mark_seen_many(self.bucket, [identity, marker, versioned])
+            return "new"
+        if self.seen.is_seen(self.bucket, versioned):
+            return None
+        tracked = self.seen.is_seen(self.bucket, marker)
+        self.seen.mark_seen_many(self.bucket, [identity, marker, versioned])
+        return "changed" if tracked else None
+
+    def apply_rules(self, item: Dict[str, Any], ts: Optional[float] = None) -> bool:
+        """Whether `item` should be posted: always without `rules`; with them, only when it
+        fired one, in which case `item["alert"]` says which."""
+        if self.rules is None:
+            return True
+        events = self.rules.evaluate(item, ts)
+        if events:
+            item["alert"] = describe(events)
+        return bool(events)
+
+    def post_item(
+        self,
+        item: Dict[str, Any],
+        identity: Optional[str] = None,
+        supersedes: Optional[List[str]] = None,
+    ):
+        """Post one item.  Give an `identity` for items that can change later, so the
+        update edits the original Mattermost post instead of adding a new one."""
+        ITEMS_POSTED.inc(source=self.name)
         self.notifier.send(
             self.name,
             {"items": [item]},
             override=self.cfg.get("notifier"),
-            template=self.template,
+            template=(self.alert_template if "alert" in item else None) or self.template,
+            identity=identity,
+            supersedes=supersedes,
         )
 
     def poll(self, now_ts: float) -> int:
         raise NotImplementedError
 
+    async def apoll(self, now_ts: float, executor=None) -> Optional[int]:
+        """Scheduler entry point.  A source may implement `poll` as a coroutine, which is
+        awaited directly; a plain `poll` runs on `executor` so it cannot block the loop.
+        None means the poll was skipped because the previous one is still running."""
+        if inspect.iscoroutinefunction(self.poll):
+            start = time.perf_counter()
+            try:
+                return await self.poll(now_ts)
+            except Exception:
+                POLL_ERRORS.inc(source=self.name)
+                raise
+            finally:
+                POLL_SECONDS.observe(time.perf_counter() - start, source=self.name)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._poll_exclusive, now_ts)
+
+    def _poll_exclusive(self, now_ts: float) -> Optional[int]:
+        # A timed-out poll keeps running in its worker thread; don't start a second one.
+        # None tells the scheduler this poll was skipped rather than found nothing.
+        if not self._poll_lock.acquire(blocking=False):
+            self.logger.warning(f"[{self.name}] previous poll still running, skipping")
+            return None
+        start = time.perf_counter()
+        try:
+            with profiler.section("poll", self.name):
+                return self.poll(now_ts)
+        except Exception:
+            POLL_ERRORS.inc(source=self.name)
+            raise
+        finally:
+            POLL_SECONDS.observe(time.perf_counter() - start, source=self.name)
+            self._poll_lock.release()
+
     # Now as a datetime object
     def now_dt(self):
         return datetime.now()
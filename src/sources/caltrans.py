@@ -1,17 +1,206 @@
 import xml.etree.ElementTree as ET
-from util.http import http_get
-from .base import SourceBase, km_between
-from typing import Dict, Any
+from util.parse_pool import parse_pool
+from .base import SourceBase, GeoFilter
+from typing import Dict, Any, Tuple
 from util.notifier import Notifier
-from util.ws5000_handler import Handler
+import functools
+import io
 import re
-import sys
-from typing import Optional
-from bs4 import BeautifulSoup, NavigableString, Tag
+import threading
 from html import unescape
-from util.ws5000_handler import Handler
 from datetime import datetime
 
+KML_NS = "{http://www.opengis.net/kml/2.2}"
+PLACEMARK_TAGS = ("Placemark", KML_NS + "Placemark")
+NAME_TAGS = ("name", KML_NS + "name")
+DESCRIPTION_TAGS = ("description", KML_NS + "description")
+COORDINATES_TAGS = ("coordinates", KML_NS + "coordinates")
+
+
+def _first_coordinate(placemark):
+    """(lat, lon) of the first vertex of the placemark's geometry (Caltrans placemarks carry
+    a single Point, LineString or Polygon)."""
+    for e in placemark.iter():
+        if e.tag in COORDINATES_TAGS:
+            parts = e.text.split(None, 1) if e.text else []
+            first = parts[0].split(",") if parts else []
+            if len(first) < 2:
+                return None
+            try:
+                return float(first[1]), float(first[0])
+            except ValueError:
+                return None
+    return None
+
+
+def iter_placemarks(source, bbox=None):
+    """Stream Placemarks out of a KML file object, yielding name/description/lat/lon dicts.
+
+    Each Placemark is detached from its parent once handled, so memory stays flat no matter
+    how many the layer holds.  With `bbox` = (lat_min, lat_max, lon_min, lon_max) anything
+    outside the box is dropped before its text is even looked at.
+    """
+    stack = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag not in PLACEMARK_TAGS:
+            continue
+        latlon = _first_coordinate(elem)
+        if latlon is not None and (
+            bbox is None
+            or (bbox[0] <= latlon[0] <= bbox[1] and bbox[2] <= latlon[1] <= bbox[3])
+        ):
+            name = desc = None
+            for child in elem:
+                if child.tag in NAME_TAGS:
+                    name = _txt(child)
+                elif child.tag in DESCRIPTION_TAGS:
+                    desc = _txt(child)
+            yield {"name": name, "description": desc, "lat": latlon[0], "lon": latlon[1]}
+        if stack:
+            stack[-1].remove(elem)
+        else:
+            elem.clear()
+
+
+def _txt(e):
+    return e.text.strip() if (e is not None and e.text) else None
+
+
+def parse_kml(data: bytes, bbox=None):
+    """iter_placemarks over an in-memory layer, as a list (parse-pool entry point)."""
+    return list(iter_placemarks(io.BytesIO(data), bbox))
+
+
+UPDATE_STAMP_RE = re.compile(r"(\d{2}/\d{2}/\d{4}\s+\d{1,2}:\d{2}\s*[ap]m)", re.I)
+LEAD_TS_RE = re.compile(r"^\s*[A-Za-z]{3,9}\s+\d{1,2}\s+\d{4}\s+\d{1,2}:\d{2}\s*[AP]M\s*", re.I)
+# The update stamp straight out of a raw description, without parsing the HTML
+RAW_UPDATE_STAMP_RE = re.compile(
+    r"update-stamp[^>]*>[^<]*?(\d{2}/\d{2}/\d{4}\s+\d{1,2}:\d{2}\s*[ap]m)", re.I
+)
+BRACKET_NUMS_RE = re.compile(r"\s*\[\s*\d+\s*\]\s*")  # e.g., [2], [12]
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+class AcronymExpander:
+    """Expands whole-word acronyms in one regex pass.  The keys are folded into a trie and
+    emitted as nested alternations (e.g. VEH(?:S)?), so at any position the engine follows
+    a single branch instead of trying every acronym in turn.  Get one through
+    acronym_expander() so each process compiles a table once."""
+
+    def __init__(self, acronyms: Dict[str, str]):
+        self.acronyms = dict(acronyms)
+        self.pattern = None
+        if self.acronyms:
+            trie: Dict[str, Any] = {}
+            for key in self.acronyms:
+                node = trie
+                for ch in key:
+                    node = node.setdefault(ch, {})
+                node[""] = {}
+            self.pattern = re.compile(r"\b" + self._trie_regex(trie) + r"\b")
+
+    @classmethod
+    def _trie_regex(cls, node: Dict[str, Any]) -> str:
+        branches = [
+            re.escape(ch) + cls._trie_regex(child) for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        terminal = "" in node
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if terminal else "")
+
+    def expand(self, text: str) -> str:
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(lambda m: self.acronyms[m.group(0)], text)
+
+
+@functools.lru_cache(maxsize=None)
+def acronym_expander(acronyms: Tuple[Tuple[str, str], ...]) -> AcronymExpander:
+    """The expander for an acronym table given as (acronym, expansion) pairs, built once
+    per process; parse workers receive the pairs rather than a pickled expander."""
+    return AcronymExpander(dict(acronyms))
+
+
+def extract_incident(soup, expander: AcronymExpander):
+    """(desc, updated_dt) from a parsed CHP incident description."""
+    updated_dt = None
+    updated_p = soup.find("p", class_="update-stamp")
+    if updated_p:
+        raw = updated_p.get_text(strip=True)
+        m = UPDATE_STAMP_RE.search(raw)
+        if m:
+            try:
+                updated_dt = datetime.strptime(m.group(1).upper(), "%m/%d/%Y %I:%M%p")
+            except ValueError:
+                updated_dt = None
+
+    parts = []
+    for p in soup.find_all("p"):
+        # Skip update-stamp and info-credit paragraphs
+        if "update-stamp" in (p.get("class") or []):
+            continue
+        block = p.get_text(separator="\n", strip=True)
+        if not block or "information courtesy of" in block.lower():
+            continue
+
+        lines = [ln for ln in block.split("\n") if ln.strip()]
+        if p.get("align", "").lower() == "left":
+            # Remove leading timestamps per line
+            lines = [LEAD_TS_RE.sub("", ln).strip() for ln in lines if ln.strip()]
+
+        # Join lines, then remove bracketed numeric tags
+        text = " ".join(lines)
+        text = BRACKET_NUMS_RE.sub(" ", text)
+
+        # Collapse whitespace and add
+        text = WHITESPACE_RE.sub(" ", text).strip()
+        if text:
+            parts.append(text)
+
+    # see also https://lostcoastoutpost.com/chpwatch/codes/
+    return expander.expand(" ".join(parts)), updated_dt
+
+
+def render_descriptions(htmls, acronyms: Tuple[Tuple[str, str], ...]):
+    """[(desc, updated_dt)] for each description's HTML (parse-pool entry point)."""
+    from bs4 import BeautifulSoup, Tag
+
+    expander = acronym_expander(acronyms)
+    out = []
+    for html in htmls:
+        soup = BeautifulSoup(html, "html.parser")
+        if soup and isinstance(soup, Tag):
+            out.append(extract_incident(soup, expander))
+        else:
+            out.append((unescape(html), None))
+    return out
+
+
+# Bounding boxes of the Caltrans sources reading each layer URL, by source name.  A layer
+# is parsed once with their union, so sources with different max_mi share the parse.
+_layer_boxes: Dict[str, Dict[str, tuple]] = {}
+_layer_boxes_lock = threading.Lock()
+
+
+def layer_bbox(url: str):
+    with _layer_boxes_lock:
+        boxes = list(_layer_boxes.get(url, {}).values())
+    if not boxes:
+        return None
+    return (
+        min(b[0] for b in boxes),
+        max(b[1] for b in boxes),
+        min(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
 
 class Caltrans(SourceBase):
 
@@ -27,11 +216,17 @@ class Caltrans(SourceBase):
         super().__init__(name, general_cfg, cfg, seen, logger, notifier)
         self.bucket = "caltrans"
         self.acronyms = cfg.get("acronyms", {})
+        self.geo = GeoFilter(
+            self.general_cfg["location"]["lat"],
+            self.general_cfg["location"]["lon"],
+            float(self.params.get("max_mi", 10.0)),
+        )
+        with _layer_boxes_lock:
+            for url in self.params.get("endpoints", {}).values():
+                _layer_boxes.setdefault(url, {})[name] = self.geo.bbox
+        self.acronym_pairs = tuple(sorted(self.acronyms.items()))
 
     def poll(self, now_ts: float) -> int:
-        lat0 = self.general_cfg["location"]["lat"]
-        lon0 = self.general_cfg["location"]["lon"]
-        max_mi = float(self.params.get("max_mi", 10.0))
         endpoints = self.params.get("endpoints", {})
         layer_filter = (self.params.get("layer_filter_prefix") or "").strip()
         headers = {
@@ -44,41 +239,20 @@ class Caltrans(SourceBase):
                 self.logger.debug(f"[CalTrans] skipping layer {layer} due to filter {layer_filter}")
                 continue
             try:
-                xml_text = http_get(
-                    url, headers=headers
-                ).text  # this is a sizable chunk of XML with lots of placemarks
-                for item_raw in self._parse_kml(xml_text):
-                    lat, lon = item_raw.get("lat"), item_raw.get("lon")
-                    if None in (lat, lon):
-                        self.logger.debug(
-                            f"[CalTrans] skipping item {item_raw} due to missing lat/lon"
-                        )
-                        continue
-                    d = km_between(lat0, lon0, lat, lon) * 0.621371  # to miles
-                    if d > max_mi:
-                        self.logger.debug(
-                            f"[CalTrans] skipping item {item_raw} due to distance {d} mi > max {max_mi} mi"
-                        )
-                        continue
-                    item = dict(item_raw)
-                    item["distance_mi"] = round(d * 0.621371, 1)
-                    item["layer"] = layer
-                    fp = f"{self.bucket}|{layer}|{item.get('name')}|{lat}|{lon}"
-                    if self.seen.is_seen(self.bucket, fp):
-                        continue
-                    self.seen.mark_seen(self.bucket, fp)
-                    soup = BeautifulSoup(item["description"], "html.parser")
-                    if soup and isinstance(soup, Tag):
-                        self.logger.debug(f"[CalTrans] sent {item['description']}\n")
-                        (item["desc"], local_dt) = self._extract_incident_from_soup(soup)
-                        item["timestamp_local"] = self.dt_str(local_dt)
-                    else:
-                        item["desc"] = unescape(item.get("description", ""))
-                        item["timestamp_local"] = self.dt_str(self.now_dt())
-                    self.logger.debug(f"[CalTrans] {layer} we substituted: {item['desc']}\n")
-
-                    self.post_item(item)
-                    new_count += 1
+                r = self.fetch_feed(url, headers=headers)
+                if r is None:
+                    continue
+                # One streaming parse per layer, with the union of the sharing sources'
+                # boxes (_poll_layer filters by our own distance); the body is dropped
+                # once it has been parsed, so only the placemarks in the box stay cached.
+                bbox = layer_bbox(url)
+                placemarks = r.parsed(
+                    ("placemarks", bbox),
+                    lambda body: self._parse_layer(body, bbox),
+                    release_body=True,
+                )
+                new_count += self._poll_layer(layer, placemarks)
+                r.remember()
             except Exception as e:
                 self.logger.error(f"[CalTrans] {layer} error: {e}")
         if new_count > 0:
@@ -87,100 +261,39 @@ class Caltrans(SourceBase):
             self.logger.debug("[CalTrans] no new items")
         return new_count
 
-    # see also https://lostcoastoutpost.com/chpwatch/codes/
-    def _de_acronymize(self, text: str) -> str:
-        """Replace known acronyms in the text with their expansions."""
-
-        def replace(match):
-            acronym = match.group(0)
-            return self.acronyms.get(acronym, acronym)
-
-        pattern = re.compile(r"\b(" + "|".join(re.escape(k) for k in self.acronyms.keys()) + r")\b")
-        return pattern.sub(replace, text) if self.acronyms else text
-
-    def _extract_incident_from_soup(self, soup):
-        updated_dt = None
-        updated_p = soup.find("p", class_="update-stamp")
-        if updated_p:
-            raw = updated_p.get_text(strip=True)
-            m = re.search(r"(\d{2}/\d{2}/\d{4}\s+\d{1,2}:\d{2}\s*[ap]m)", raw, flags=re.I)
-            if m:
-                try:
-                    updated_dt = datetime.strptime(m.group(1).upper(), "%m/%d/%Y %I:%M%p")
-                except ValueError:
-                    updated_dt = None
-
-        # Patterns
-        lead_ts = re.compile(
-            r"^\s*[A-Za-z]{3,9}\s+\d{1,2}\s+\d{4}\s+\d{1,2}:\d{2}\s*[AP]M\s*", re.I
-        )
-        bracket_nums = re.compile(r"\s*\[\s*\d+\s*\]\s*")  # e.g., [2], [12]
+    def _parse_layer(self, data: bytes, bbox):
+        """The placemarks of a layer inside `bbox`; large layers go to the parse pool."""
+        return parse_pool.run(parse_kml, data, bbox, size=len(data))
 
-        parts = []
-        for p in soup.find_all("p"):
-            # Skip update-stamp and info-credit paragraphs
-            if "update-stamp" in (p.get("class") or []):
-                continue
-            block = p.get_text(separator="\n", strip=True)
-            if not block or "information courtesy of" in block.lower():
+    def _poll_layer(self, layer: str, placemarks) -> int:
+        nearby = self.geo.within([p["lat"] for p in placemarks], [p["lon"] for p in placemarks])
+        self.count_items(len(placemarks), len(nearby))
+        fresh = []
+        for i, d in nearby:
+            item = dict(placemarks[i])
+            lat, lon = item["lat"], item["lon"]
+            item["distance_mi"] = round(d, 1)
+            item["layer"] = layer
+            identity = f"{self.bucket}|{layer}|{item.get('name')}|{lat}|{lon}"
+            # A new update stamp on the incident is a new version of the same post.
+            m = RAW_UPDATE_STAMP_RE.search(item.get("description") or "")
+            stamp = re.sub(r"\s+", "", m.group(1).lower()) if m else ""
+            status = self.check_version(identity, f"u{stamp}")
+            if status is None:
                 continue
+            if status == "changed":
+                item["updated"] = True
+            fresh.append((identity, item))
+        rendered = self._render_descriptions([item.get("description") or "" for _, item in fresh])
+        for (identity, item), (desc, local_dt) in zip(fresh, rendered):
+            item["desc"] = desc
+            item["timestamp_local"] = self.dt_str(local_dt or self.now_dt())
+            self.logger.debug(f"[CalTrans] {layer} we substituted: {item['desc']}\n")
+            self.post_item(item, identity=identity)
+        return len(fresh)
 
-            lines = [ln for ln in block.split("\n") if ln.strip()]
-            if p.get("align", "").lower() == "left":
-                # Remove leading timestamps per line
-                lines = [lead_ts.sub("", ln).strip() for ln in lines if ln.strip()]
-
-            # Join lines, then remove bracketed numeric tags
-            text = " ".join(lines)
-            text = bracket_nums.sub(" ", text)
-
-            # Collapse whitespace and add
-            text = re.sub(r"\s+", " ", text).strip()
-            if text:
-                parts.append(text)
-
-        return self._de_acronymize(" ".join(parts)), updated_dt
-
-    def _parse_kml(self, xml_text: str):
-        root = ET.fromstring(xml_text)
-        ns = {"k": "http://www.opengis.net/kml/2.2"}
-        items = []
-        for pm in root.findall(".//Placemark") + root.findall(".//k:Placemark", ns):
-            name = self._txt(pm.find("name")) or self._txt(
-                pm.find("{http://www.opengis.net/kml/2.2}name")
-            )
-            desc = self._txt(pm.find("description")) or self._txt(
-                pm.find("{http://www.opengis.net/kml/2.2}description")
-            )
-
-            lon = lat = None
-            coord_text = None
-            pt = pm.find("Point") or pm.find("{http://www.opengis.net/kml/2.2}Point")
-            if pt is not None:
-                c = pt.find("coordinates") or pt.find("{http://www.opengis.net/kml/2.2}coordinates")
-                coord_text = self._txt(c)
-            if coord_text is None:
-                for tag in ("LineString", "Polygon"):
-                    g = pm.find(tag) or pm.find(f"{{http://www.opengis.net/kml/2.2}}{tag}")
-                    if g is not None:
-                        c = g.find("coordinates") or g.find(
-                            "{http://www.opengis.net/kml/2.2}coordinates"
-                        )
-                        coord_text = self._txt(c)
-                        break
-            if coord_text:
-                parts = coord_text.strip().split()
-                if parts:
-                    first = parts[0].split(",")
-                    if len(first) >= 2:
-                        try:
-                            lon = float(first[0])
-                            lat = float(first[1])
-                        except ValueError:
-                            lon = lat = None
-
-            items.append({"name": name, "description": desc, "lon": lon, "lat": lat})
-        return items
-
-    def _txt(self, e):
-        return e.text.strip() if (e is not None and e.text) else None
+    def _render_descriptions(self, htmls):
+        """(desc, updated_dt) per description, rendered in one batch, on the parse pool
+        when there are enough of them."""
+        size = sum(len(html) for html in htmls)
+        return parse_pool.run(render_descriptions, htmls, self.acronym_pairs, size=size)
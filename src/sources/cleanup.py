@@ -1,5 +1,6 @@
 from .base import SourceBase
 from typing import Dict, Any
+import time
 from util.notifier import Notifier
 from util.mattermost_api import MattermostAPI, MattermostContext
 
@@ -21,6 +22,8 @@ class CleanUp(SourceBase):
         self.general_config = general_config
         self.mattermost_config = self.general_config.get("mattermost", {})
         self.logger = logger
+        # Unlike the feed sources, a sweep is not needed right after a restart.
+        self.next_due = time.time() + self.poll_seconds
         self.logger.info(f"[cleanup] Initialized")
         url = self.mattermost_config.get("host", "localhost")
         token = self.mattermost_config.get("token", "")
@@ -39,5 +42,10 @@ class CleanUp(SourceBase):
             threshold_minutes = target.get("threshold_minutes", 60)
             self.logger.info(f"[cleanup] Cleaning up channel {channel}")
             self.apiInstance.delete_messages_in_channel(
-                admin_user, channel, board, threshold_minutes * 60
+                admin_user,
+                channel,
+                board,
+                threshold_minutes * 60,
+                workers=target.get("workers", 4),
+                max_per_second=target.get("max_deletes_per_second", 10.0),
             )
@@ -0,0 +1,92 @@
+from typing import Dict, List, Sequence, Tuple
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_MI = 1.609344
+EARTH_RADIUS_MI = EARTH_RADIUS_KM / KM_PER_MI
+
+
+def km_between(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = EARTH_RADIUS_KM
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * R * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat0: float, lon0: float, max_mi: float, margin: float = 1.001):
+    """(lat_min, lat_max, lon_min, lon_max) that fully contains the max_mi circle; a cheap
+    reject before any trigonometry.  Uses the same sphere as the haversine distance (the
+    widest longitude of a spherical cap is asin(sin(d/R) / cos(lat0))), grown by `margin`
+    so rounding never drops a point right on the edge."""
+    ang = max_mi * margin / EARTH_RADIUS_MI
+    dlat = math.degrees(ang)
+    cos_lat = math.cos(math.radians(lat0))
+    if math.sin(ang) >= cos_lat:  # the circle reaches over a pole
+        return (max(lat0 - dlat, -90.0), min(lat0 + dlat, 90.0), -180.0, 180.0)
+    dlon = math.degrees(math.asin(math.sin(ang) / cos_lat))
+    return (lat0 - dlat, lat0 + dlat, lon0 - dlon, lon0 + dlon)
+
+
+def haversine_mi(lat0: float, lon0: float, lats, lons):
+    """Great-circle miles from (lat0, lon0) to every point, in one vectorized pass."""
+    import numpy as np  # only the sources that filter by distance pay for numpy
+
+    p0 = math.radians(lat0)
+    p = np.radians(lats)
+    dphi = p - p0
+    dl = np.radians(lons - lon0)
+    a = np.sin(dphi / 2) ** 2 + math.cos(p0) * np.cos(p) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(a))
+
+
+class GeoFilter:
+    """Keeps the points within `max_mi` of a fixed origin.
+
+    `within()` takes coordinate arrays, rejects everything outside the bounding box with a
+    vectorized comparison, then computes haversine distances for the survivors in one batch.
+    Distances are memoized by (lat, lon) because most feed entries (road closures, signs,
+    the day's quakes) sit at the same coordinates poll after poll.
+    """
+
+    def __init__(self, lat0: float, lon0: float, max_mi: float, memo_size: int = 20000):
+        self.lat0 = float(lat0)
+        self.lon0 = float(lon0)
+        self.max_mi = float(max_mi)
+        self.bbox = bounding_box(self.lat0, self.lon0, self.max_mi)
+        self.memo_size = memo_size
+        self._memo: Dict[Tuple[float, float], float] = {}
+
+    def within(self, lats: Sequence[float], lons: Sequence[float]) -> List[Tuple[int, float]]:
+        """(index, miles) for every input point no farther than max_mi, in input order."""
+        import numpy as np
+
+        lat = np.asarray(lats, dtype=np.float64)
+        lon = np.asarray(lons, dtype=np.float64)
+        if lat.size == 0:
+            return []
+        lat_min, lat_max, lon_min, lon_max = self.bbox
+        candidates = np.flatnonzero(
+            (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        )
+        if candidates.size == 0:
+            return []
+        keys = list(zip(lat[candidates].tolist(), lon[candidates].tolist()))
+        dists = [self._memo.get(k) for k in keys]
+        missing = [i for i, d in enumerate(dists) if d is None]
+        if missing:
+            fresh = haversine_mi(
+                self.lat0,
+                self.lon0,
+                lat[candidates[missing]],
+                lon[candidates[missing]],
+            ).tolist()
+            if len(self._memo) + len(missing) > self.memo_size:
+                self._memo.clear()
+            for i, d in zip(missing, fresh):
+                dists[i] = d
+                self._memo[keys[i]] = d
+        return [
+            (int(idx), d) for idx, d in zip(candidates.tolist(), dists) if d <= self.max_mi
+        ]
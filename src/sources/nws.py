@@ -1,6 +1,6 @@
-from util.http import http_get
 from .base import SourceBase
 from typing import Dict, Any
+import json
 from util.notifier import Notifier
 
 
@@ -26,8 +26,12 @@ class NWS(SourceBase):
             "User-Agent": self.general_cfg.get("user_agent", ""),
             "Accept": "application/geo+json, application/json",
         }
-        data = http_get(api, headers=headers, params={"point": f"{lat},{lon}"}).json()
+        r = self.fetch_feed(api, headers=headers, params={"point": f"{lat},{lon}"})
+        if r is None:
+            return 0
+        data = r.parsed("json", json.loads)
         feats = data.get("features", [])
+        self.count_items(len(feats))
         new_count = 0
         for f in feats:
             p = f.get("properties", {})
@@ -48,8 +52,17 @@ class NWS(SourceBase):
             if self.seen.is_seen(self.bucket, fp):
                 continue
             self.seen.mark_seen(self.bucket, fp)
-            self.post_item(item)
+            if not self.apply_rules(item):
+                continue
+            # An update or cancellation lists the alerts it replaces; edit their post.
+            supersedes = [
+                f"{self.bucket}|{ref.get('@id') or ref.get('identifier')}"
+                for ref in p.get("references") or []
+                if ref.get("@id") or ref.get("identifier")
+            ]
+            self.post_item(item, identity=fp, supersedes=supersedes)
             new_count += 1
+        r.remember()
         if new_count:
             self.logger.info(f"[NWS] {new_count} new alerts")
         else:
@@ -1,8 +1,32 @@
-from bs4 import BeautifulSoup
-from util.http import http_get
 from .base import SourceBase
 from typing import Dict, Any
 from util.notifier import Notifier
+from util.parse_pool import parse_pool
+
+
+def parse_stories(html: str, origin: str):
+    """[{title, link}] for every headline link on the news page (parse-pool entry point)."""
+    from bs4 import BeautifulSoup
+
+    stories = []
+    soup = BeautifulSoup(html, "html.parser")
+    for a in soup.find_all("a", href=True):
+        hdr = a.find(["h2", "h3"])
+        if not hdr:
+            continue
+        title = hdr.get_text(strip=True)
+        href = a["href"]
+        if not title or not href:
+            continue
+        link = (
+            (origin + href)
+            if href.startswith("/")
+            else (href if href.startswith("http") else None)
+        )
+        if not link:
+            continue
+        stories.append({"title": title, "link": link})
+    return stories
 
 
 class PAO(SourceBase):
@@ -26,26 +50,18 @@ class PAO(SourceBase):
             "User-Agent": self.general_cfg.get("user_agent", ""),
             "Accept": "text/html",
         }
-        html = http_get(url, headers=headers).text
-        soup = BeautifulSoup(html, "html.parser")
+        r = self.fetch_feed(url, headers=headers)
+        if r is None:
+            return 0
         origin = url.split("/news")[0].rstrip("/")
+        stories = r.parsed(
+            ("stories", origin),
+            lambda body: parse_pool.run(parse_stories, r.text, origin, size=len(body)),
+        )
+        self.count_items(len(stories))
         new_count = 0
-        for a in soup.find_all("a", href=True):
-            hdr = a.find(["h2", "h3"])
-            if not hdr:
-                continue
-            title = hdr.get_text(strip=True)
-            href = a["href"]
-            if not title or not href:
-                continue
-            link = (
-                (origin + href)
-                if href.startswith("/")
-                else (href if href.startswith("http") else None)
-            )
-            if not link:
-                continue
-            item = {"title": title, "link": link}
+        for item in stories:
+            title, link = item["title"], item["link"]
             fp = f"{self.bucket}|{title}|{link}"
             if self.seen.is_seen(self.bucket, fp):
                 continue
@@ -54,6 +70,7 @@ class PAO(SourceBase):
             new_count += 1
             if new_count >= max_items:
                 break
+        r.remember()
         if new_count:
             self.logger.info(f"[PAO] {new_count} new stories")
         else:
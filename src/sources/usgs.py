@@ -1,9 +1,12 @@
+from .base import SourceBase, GeoFilter
+from .geo import KM_PER_MI
+from typing import Dict, Any, List
+import json
 from util.http import http_get
-from .base import SourceBase, km_between
-from typing import Dict, Any
 from util.notifier import Notifier
+from datetime import datetime, timezone
 
-# from datetime import datetime, timezone
+FDSN_QUERY_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query"
 
 
 class USGS(SourceBase):
@@ -19,33 +22,90 @@ class USGS(SourceBase):
     ) -> None:
         super().__init__(name, cfg, general_cfg, seen, logger, notifier)
         self.bucket = "usgs"
+        self.geo = GeoFilter(
+            self.general_cfg["location"]["lat"],
+            self.general_cfg["location"]["lon"],
+            float(self.params.get("max_mi", 100.0)),
+        )
 
     def poll(self, now_ts: float) -> int:
+        if str(self.params.get("mode", "feed")).lower() == "fdsn":
+            return self._report(self._fetch_fdsn(now_ts))
+        r = self._fetch_feed()
+        if r is None:
+            return 0
+        # Instances with different max_mi and channels share one download and one parse.
+        new_count = self._report(r.parsed("json", json.loads).get("features", []))
+        r.remember()
+        return new_count
+
+    def _fetch_feed(self):
         feed = self.params.get(
             "feed_url",
             "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson",
         )
+        return self.fetch_feed(feed, headers={"User-Agent": self.general_cfg.get("user_agent", "")})
+
+    def _hwm_key(self) -> str:
+        return f"{self.bucket}|{self.name}|updated_hwm"
+
+    def _fetch_fdsn(self, now_ts: float):
+        """Only events within max_mi and above the magnitude floor that were added or
+        revised since the last poll, as filtered by the FDSN event service."""
+        hwm = self.seen.get_meta(self._hwm_key())
+        if hwm is None:
+            lookback = float(self.params.get("fdsn_lookback_hours", 24))
+            since_ms = int((now_ts - lookback * 3600) * 1000)
+        else:
+            since_ms = int(hwm)
+        params = {
+            "format": "geojson",
+            "latitude": self.geo.lat0,
+            "longitude": self.geo.lon0,
+            "maxradiuskm": round(self.geo.max_mi * KM_PER_MI, 1),
+            "minmagnitude": self.params.get("ignore_magnitude_below", 1.0),
+            "updatedafter": datetime.fromtimestamp(since_ms / 1000, timezone.utc)
+            .isoformat(timespec="milliseconds")
+            .replace("+00:00", ""),
+            "orderby": "time-asc",
+        }
+        # The query changes every poll, so there are no validators worth keeping.
+        r = http_get(
+            self.params.get("fdsn_url", FDSN_QUERY_URL),
+            headers={"User-Agent": self.general_cfg.get("user_agent", "")},
+            params=params,
+        )
+        self._note_freshness(r)
+        feats = r.json().get("features", []) if r.status_code != 204 and r.content else []
+        newest = max((f.get("properties", {}).get("updated") or 0 for f in feats), default=0)
+        if newest > since_ms:
+            self.seen.set_meta(self._hwm_key(), str(newest))
+        return feats
+
+    def _report(self, feats: List[Dict[str, Any]]) -> int:
         min_magnitude = self.params.get("ignore_magnitude_below", 1.0)
-        lat0 = self.general_cfg["location"]["lat"]
-        lon0 = self.general_cfg["location"]["lon"]
-        max_mi = float(self.params.get("max_mi", 100.0))
-        data = http_get(feed, headers={"User-Agent": self.general_cfg.get("user_agent", "")}).json()
-        feats = data.get("features", [])
-        new_count = 0
+        located, lats, lons = [], [], []
         for f in feats:
-            props = f.get("properties", {})
             geom = f.get("geometry", {}) or {}
             coords = geom.get("coordinates", [None, None, None])
-            lon, lat, depth = coords[0], coords[1], coords[2]
-            if None in (lat, lon):
-                continue
-            dist = km_between(lat0, lon0, lat, lon) * 0.621371  # to miles
-            if dist > max_mi:
+            if None in (coords[0], coords[1]):
                 continue
+            located.append(f)
+            lons.append(coords[0])
+            lats.append(coords[1])
+        nearby = self.geo.within(lats, lons)
+        self.count_items(len(feats), len(nearby))
+        new_count = 0
+        for i, dist in nearby:
+            f = located[i]
+            props = f.get("properties", {})
+            lon, lat, depth = f["geometry"]["coordinates"][:3]
 
             self.logger.debug(f"[USGS] Earthquake data: {f}")
             self.logger.debug(f'[USGS] Time: {props.get("time")}')
 
+            if props.get("mag") is None:
+                continue
             magnitude = float(props.get("mag"))
             if magnitude < min_magnitude:
                 # self.logger.info(
@@ -53,6 +113,13 @@ class USGS(SourceBase):
                 # )
                 continue
 
+            # The version is the magnitude to 0.1, so a re-reviewed event is reported again
+            # only when its magnitude changes.
+            identity = f"{self.bucket}|{f.get('id')}"
+            status = self.check_version(identity, f"m{magnitude:.1f}")
+            if status is None:
+                continue
+
             unix_ts = int(props.get("time", 0) / 1000)  # time is of format 1756070780800
             dt = self.unix_to_dt(unix_ts)
             timestamp_local = self.dt_utc_to_local_str(dt)
@@ -68,14 +135,14 @@ class USGS(SourceBase):
                 "depth_km": depth,
                 "distance_mi_from_origin": round(dist, 1),
             }
-            fp = f"{self.bucket}|{item['id']}"
-            if self.seen.is_seen(self.bucket, fp):
+            if status == "changed":
+                item["revised"] = True
+            if not self.apply_rules(item):
                 continue
-            self.seen.mark_seen(self.bucket, fp)
-            self.post_item(item)
+            self.post_item(item, identity=identity)
             new_count += 1
         if new_count:
-            self.logger.info(f"[USGS] {new_count} new earthquake report(s)")
+            self.logger.info(f"[USGS] {new_count} new or revised earthquake report(s)")
         else:
             self.logger.debug("[USGS] no new quakes")
         return new_count
@@ -0,0 +1,108 @@
+import json, os, threading, time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class ChannelResolver:
+    """Resolves (channel, team, user) display names to channel IDs for every notifier.
+
+    The user, their teams and their channels in each team are fetched at most once per
+    process, all configured channels are resolved in one batch, and the resulting map is
+    persisted with a TTL per entry so a warm restart makes no lookup calls at all.
+    """
+
+    def __init__(
+        self, mattermost_api, logger, cache_path: Optional[str] = None, ttl_seconds=86400
+    ):
+        self.mattermost_api = mattermost_api
+        self.logger = logger
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self._ids: Dict[str, str] = {}
+        self._resolved_at: Dict[str, float] = {}
+        self._missing = set()  # keys already reported as not found
+        self._user_ids: Dict[str, str] = {}
+        self._teams: Dict[str, Dict[str, str]] = {}  # user -> team display name -> team id
+        self._channels: Dict[Tuple[str, str], Dict[str, str]] = {}  # (user, team) -> name -> id
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(channel: str, team: str, user: str) -> str:
+        return f"{user}|{team}|{channel}"
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        now = time.time()
+        for key, entry in data.get("channels", {}).items():
+            if isinstance(entry, str):  # older files had one saved_at for the whole map
+                entry = {"id": entry, "resolved_at": data.get("saved_at", 0)}
+            if now - float(entry.get("resolved_at", 0)) < self.ttl_seconds:
+                self._ids[key] = entry["id"]
+                self._resolved_at[key] = float(entry["resolved_at"])
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp = f"{self.cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            channels = {
+                key: {"id": channel_id, "resolved_at": self._resolved_at[key]}
+                for key, channel_id in self._ids.items()
+            }
+            json.dump({"channels": channels}, f, indent=2)
+        os.replace(tmp, self.cache_path)
+
+    def _channel_map(self, team: str, user: str) -> Dict[str, str]:
+        if (user, team) in self._channels:
+            return self._channels[(user, team)]
+        if user not in self._user_ids:
+            self._user_ids[user] = self.mattermost_api.users.get_user_by_username(user).get("id")
+        user_id = self._user_ids[user]
+        if user not in self._teams:
+            teams = self.mattermost_api.teams.get_user_teams(user_id)
+            self._teams[user] = {t["display_name"]: t["id"] for t in teams}
+        team_id = self._teams[user].get(team)
+        channels: Dict[str, str] = {}
+        if team_id is None:
+            self.logger.warning(f"[Notifier] Team {team} not found for user {user}.")
+        else:
+            found = self.mattermost_api.channels.get_channels_for_user(user_id, team_id) or []
+            if not found:
+                self.logger.warning(f"[Notifier] No channels found for team {team}.")
+            channels = {c["display_name"]: c["id"] for c in found}
+        self._channels[(user, team)] = channels
+        return channels
+
+    def resolve_many(self, wanted: Iterable[Tuple[str, str, str]]) -> Dict[str, Optional[str]]:
+        """Resolve every (channel, team, user) in one pass; only cache misses hit the server."""
+        out: Dict[str, Optional[str]] = {}
+        changed = False
+        with self._lock:
+            for channel, team, user in wanted:
+                key = self._key(channel, team, user)
+                if key not in self._ids:
+                    channel_id = self._channel_map(team, user).get(channel)
+                    if channel_id is None:
+                        if key not in self._missing:
+                            self._missing.add(key)
+                            self.logger.warning(
+                                f"[Notifier] Channel {channel} not found in team {team}."
+                            )
+                    else:
+                        self._ids[key] = channel_id
+                        self._resolved_at[key] = time.time()
+                        changed = True
+                out[key] = self._ids.get(key)
+            if changed:
+                self._save()
+        return out
+
+    def resolve(self, channel: str, team: str, user: str) -> Optional[str]:
+        return self.resolve_many([(channel, team, user)])[self._key(channel, team, user)]
@@ -0,0 +1,215 @@
+import hashlib, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlencode
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from util.http import DEFAULT_TIMEOUT, _validator_key, http_get, validators
+from util.metrics import registry
+
+FEED_REQUESTS = registry.counter(
+    "newsfeeds_feed_cache_requests_total",
+    "Feed reads by how they were served (hit, joined, fetched, not_modified)",
+    ["result"],
+)
+FEED_PARSES = registry.counter(
+    "newsfeeds_feed_cache_parses_total", "Parsed feed lookups (hit or parsed)", ["result"]
+)
+
+# the consumer name the shared upstream validators are kept under
+SHARED = ""
+
+
+class _Entry:
+    """One fetched representation.  `body` is None after a 304 to a cold cache, when only
+    the persisted validators are known, once the entry has expired, and once a consumer
+    has released it after parsing."""
+
+    def __init__(self, body: Optional[bytes], headers, validators: Dict[str, str], ttl: float):
+        self.body = body
+        self.headers = headers
+        self.validators = validators
+        self.fetched = time.monotonic()
+        self.fresh_until = self.fetched + ttl
+        self.parsed: Dict[Any, Any] = {}
+        self.parse_lock = threading.Lock()
+
+    def expired(self) -> "_Entry":
+        """A stale copy keeping only the headers and validators, for revalidation."""
+        stub = _Entry(None, CaseInsensitiveDict(self.headers), self.validators, 0.0)
+        stub.fetched = self.fetched
+        return stub
+
+
+class Feed:
+    """What one consumer gets back from FeedCache.fetch: the shared body and headers, plus
+    `parsed()` for a parse shared by every consumer of the same representation."""
+
+    def __init__(self, entry: _Entry, consumer_key: str):
+        self._entry = entry
+        self._consumer_key = consumer_key
+        self.content = entry.body
+        self.headers = entry.headers
+        self.age = time.monotonic() - entry.fetched
+
+    @property
+    def text(self) -> str:
+        encoding = get_encoding_from_headers(self.headers) or "utf-8"
+        return self.content.decode(encoding, errors="replace")
+
+    def parsed(self, parse_key, parse: Callable[[bytes], Any], release_body=False) -> Any:
+        """`parse(body)`, run once per representation and `parse_key`.  The result is
+        shared, so consumers must not modify it.  `release_body` drops the body once it
+        is parsed; only for feeds every consumer reads through this one parse_key."""
+        entry = self._entry
+        with entry.parse_lock:
+            if parse_key in entry.parsed:
+                FEED_PARSES.inc(result="hit")
+            else:
+                if entry.body is None:
+                    raise RuntimeError(f"feed body released before parsing {parse_key!r}")
+                FEED_PARSES.inc(result="parsed")
+                entry.parsed[parse_key] = parse(entry.body)
+                if release_body:
+                    entry.body = None
+                    self.content = None
+            return entry.parsed[parse_key]
+
+    def remember(self):
+        """Record that this consumer has processed this representation; until the feed
+        changes, fetch() returns None for it."""
+        validators.put_entry(self._consumer_key, self._entry.validators)
+
+
+class FeedCache:
+    """Process-wide cache of fetched feeds, so several sources polling the same URL cost
+    one download and one parse.
+
+    Entries are keyed by URL, query parameters and request headers.  A fetch within
+    `ttl_seconds` of the last one is served from memory; otherwise the first caller
+    revalidates upstream with a conditional GET and concurrent callers for the same key
+    wait on that one request.  Past its TTL an entry keeps only its validators: the body
+    and parses are released once the consumers still using them are done.  Each consumer
+    remembers the validators (ETag/Last-Modified, or a body digest) of the representation
+    it last processed, persisted in the HTTP cache file, and is handed a Feed only when
+    that differs.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, ttl_seconds: float = 30.0, max_entries: int = 64):
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.max_entries = max(1, int(max_entries))
+
+    def fetch(
+        self,
+        url: str,
+        headers=None,
+        params=None,
+        timeout: int = DEFAULT_TIMEOUT,
+        consumer: str = "",
+        on_response: Optional[Callable[[Feed], None]] = None,
+    ) -> Optional[Feed]:
+        """The feed for `consumer`, or None when it is unchanged since the consumer last
+        processed it.  The caller calls Feed.remember() once it has dealt with the feed,
+        so a failure part-way through is retried on the next poll.  `on_response` sees the
+        feed either way (for its caching headers and age)."""
+        key = f"{url}|{urlencode(sorted((params or {}).items()))}|"
+        key += urlencode(sorted((headers or {}).items()))
+        consumer_key = _validator_key(consumer, url, params)
+        entry = self._get(key, url, headers, params, timeout, need_body=False)
+        if on_response is not None:
+            on_response(Feed(entry, consumer_key))
+        if validators.get(consumer_key) == entry.validators:
+            return None
+        if entry.body is None and not entry.parsed:
+            entry = self._get(key, url, headers, params, timeout, need_body=True)
+        return Feed(entry, consumer_key)
+
+    def _expire(self, now: float):
+        # Feeds still held by consumers keep the old entry alive until they are done.
+        for key, entry in self._entries.items():
+            if (entry.body is not None or entry.parsed) and now >= entry.fresh_until:
+                self._entries[key] = entry.expired()
+
+    def _get(self, key, url, headers, params, timeout, need_body: bool) -> _Entry:
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            usable = entry is not None and (
+                entry.body is not None or bool(entry.parsed) or not need_body
+            )
+            if usable and time.monotonic() < entry.fresh_until:
+                self._entries.move_to_end(key)
+                FEED_REQUESTS.inc(result="hit")
+                return entry
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+        if not leader:
+            FEED_REQUESTS.inc(result="joined")
+            entry = flight.result()
+            if entry.body is None and not entry.parsed and need_body:
+                return self._get(key, url, headers, params, timeout, need_body)
+            return entry
+        # a body can only come from an unconditional request once we know we lack one
+        conditional = usable or not need_body
+        try:
+            entry = self._refresh(
+                entry if usable else None, url, headers, params, timeout, conditional
+            )
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        flight.set_result(entry)
+        return entry
+
+    def _refresh(
+        self, entry: Optional[_Entry], url, headers, params, timeout, conditional: bool
+    ) -> _Entry:
+        shared_key = _validator_key(SHARED, url, params)
+        # With no cached entry the validators persisted from an earlier run still let the
+        # server answer 304, which is enough for consumers that processed that version.
+        known = entry.validators if entry is not None else validators.get(shared_key)
+        if not conditional:
+            known = {}
+        cond = dict(headers or {})
+        if known.get("etag"):
+            cond["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            cond["If-Modified-Since"] = known["last_modified"]
+        r = http_get(url, headers=cond, params=params, timeout=timeout)
+        if r.status_code == 304:
+            FEED_REQUESTS.inc(result="not_modified")
+            if entry is None:
+                return _Entry(None, CaseInsensitiveDict(r.headers), known, self.ttl_seconds)
+            entry.headers.update(r.headers)
+            entry.fetched = time.monotonic()
+            entry.fresh_until = entry.fetched + self.ttl_seconds
+            return entry
+        FEED_REQUESTS.inc(result="fetched")
+        body = r.content
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        validators.put(shared_key, etag, last_modified)
+        found = {k: v for k, v in (("etag", etag), ("last_modified", last_modified)) if v}
+        if not found:
+            found = {"digest": hashlib.blake2b(body, digest_size=16).hexdigest()}
+        return _Entry(body, CaseInsensitiveDict(r.headers), found, self.ttl_seconds)
+
+
+feed_cache = FeedCache()
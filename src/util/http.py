@@ -1,16 +1,149 @@
-import time, requests
+import json, os, threading, time, requests
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlencode, urlsplit
+from requests.adapters import HTTPAdapter
+from util.metrics import registry
 
 DEFAULT_TIMEOUT = 30
 
+try:
+    import brotli  # noqa: F401  (urllib3 only decodes "br" when a brotli module is importable)
 
-def http_get(url, headers=None, params=None, timeout: int = DEFAULT_TIMEOUT):
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+HTTP_REQUESTS = registry.counter(
+    "newsfeeds_http_requests_total", "HTTP responses by host and status", ["host", "status"]
+)
+HTTP_SECONDS = registry.histogram(
+    "newsfeeds_http_request_duration_seconds", "Time to response headers", ["host", "method"]
+)
+HTTP_BYTES = registry.counter(
+    "newsfeeds_http_response_bytes_total", "Response body bytes received", ["host"]
+)
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def session_for(url: str) -> requests.Session:
+    """One keep-alive Session per host, so repeated polls reuse the TCP+TLS connection."""
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _sessions[host] = s
+        return s
+
+
+class ValidatorCache:
+    """ETag/Last-Modified validators per (consumer, url, params), persisted as JSON so a
+    restart still sends conditional requests.  The feed cache also keeps, per consumer, the
+    validators of the version that consumer last processed."""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, path: str):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+
+    def get(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self.entries.get(key, {}))
+
+    def put(self, key: str, etag: Optional[str], last_modified: Optional[str]):
+        entry = {k: v for k, v in (("etag", etag), ("last_modified", last_modified)) if v}
+        self.put_entry(key, entry)
+
+    def put_entry(self, key: str, entry: Dict[str, str]):
+        with self._lock:
+            if self.entries.get(key) == entry:
+                return
+            if entry:
+                self.entries[key] = entry
+            else:
+                self.entries.pop(key, None)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp, self.path)
+
+
+validators = ValidatorCache()
+
+
+def configure_http(cache_path: Optional[str] = None):
+    if cache_path:
+        validators.load(cache_path)
+
+
+def freshness_seconds(headers) -> Optional[float]:
+    """How long the server says this response stays fresh: Cache-Control max-age (less
+    Age), else Expires - Date.  0 for no-cache/no-store, None when there is no hint."""
+    for directive in (headers.get("Cache-Control") or "").split(","):
+        name, _, value = directive.strip().partition("=")
+        name = name.lower()
+        if name in ("no-cache", "no-store"):
+            return 0.0
+        if name == "max-age":
+            try:
+                return max(0.0, float(value.strip('"')) - float(headers.get("Age") or 0))
+            except ValueError:
+                return 0.0
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            date = headers.get("Date")
+            now = parsedate_to_datetime(date).timestamp() if date else time.time()
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - now)
+        except (TypeError, ValueError):
+            return 0.0  # e.g. "Expires: 0" means already stale
+    return None
+
+
+def _validator_key(consumer: str, url: str, params) -> str:
+    query = urlencode(sorted((params or {}).items()))
+    return f"{consumer}|{url}|{query}"
+
+
+def _observe(r: requests.Response, host: str, method: str, stream: bool = False):
+    HTTP_SECONDS.observe(r.elapsed.total_seconds(), host=host, method=method)
+    HTTP_REQUESTS.inc(host=host, status=str(r.status_code))
+    # A streamed body hasn't been read yet; fall back to what the server announced.
+    size = r.headers.get("Content-Length", 0) if stream else len(r.content)
+    try:
+        HTTP_BYTES.inc(int(size), host=host)
+    except ValueError:
+        pass
+
+
+def http_get(url, headers=None, params=None, timeout: int = DEFAULT_TIMEOUT, stream=False):
     backoff = [0, 1.0, 2.0]
     last_exc = None
+    session = session_for(url)
+    host = urlsplit(url).netloc
     for delay in backoff:
         if delay:
             time.sleep(delay)
         try:
-            r = requests.get(url, headers=headers, params=params, timeout=timeout)
+            r = session.get(url, headers=headers, params=params, timeout=timeout, stream=stream)
+            _observe(r, host, "GET", stream)
             r.raise_for_status()
             return r
         except Exception as e:
@@ -26,12 +159,13 @@ def post_json(url, payload, headers=None, timeout: int = DEFAULT_TIMEOUT):
         if delay:
             time.sleep(delay)
         try:
-            r = requests.post(url, json=payload, headers=headers, timeout=timeout)
+            r = session_for(url).post(url, json=payload, headers=headers, timeout=timeout)
+            _observe(r, urlsplit(url).netloc, "POST")
             r.raise_for_status()
             return r.status_code
         except Exception as e:
             last_exc = e
-    raise RuntimeError(f"POST failed: {url} :: {last_exc}")
+    raise RuntimeError(f"POST failed: {url} :: {last_exc}") from last_exc
 
 
 def post_multipart(url, files, data=None, headers=None, timeout: int = DEFAULT_TIMEOUT):
@@ -42,15 +176,16 @@ def post_multipart(url, files, data=None, headers=None, timeout: int = DEFAULT_T
         if delay:
             time.sleep(delay)
         try:
-            r = requests.post(
+            r = session_for(url).post(
                 url,
                 files=files,
                 data=data or {},
                 headers=headers or {},
                 timeout=timeout,
             )
+            _observe(r, urlsplit(url).netloc, "POST")
             r.raise_for_status()
             return r
         except Exception as e:
             last_exc = e
-    raise RuntimeError(f"POST multipart failed: {url} :: {last_exc}")
+    raise RuntimeError(f"POST multipart failed: {url} :: {last_exc}") from last_exc
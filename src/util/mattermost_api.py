@@ -1,5 +1,8 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from mattermostdriver import Driver
+from mattermostdriver.exceptions import ResourceNotFound
+import threading
 import time
 import logging
 
@@ -14,6 +17,23 @@ def build_logger(level: str, module):
     return logging.getLogger(module)
 
 
+class RateLimiter:
+    """Spaces calls at least 1/max_per_second apart across all threads."""
+
+    def __init__(self, max_per_second: float):
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
 class MattermostContext:
     def __init__(self, apiInstance):
         self.apiInstance = apiInstance
@@ -161,67 +181,104 @@ class MattermostAPI:
         self.logger.info(self.driver.channels.create_channel(options=self.hoover_channel()))
 
     def delete_messages_in_channel(
-        self, user_name, channel_name, team_name, age_threshold_seconds=AGE_THRESHOLD_SECONDS
+        self,
+        user_name,
+        channel_name,
+        team_name,
+        age_threshold_seconds=AGE_THRESHOLD_SECONDS,
+        workers=4,
+        max_per_second=10.0,
     ):
+        """Delete posts older than the threshold using one authenticated session.
+
+        Stale post IDs are collected first, paging backwards with a `before` cursor so the
+        pages cannot shift under us, then deleted by a bounded pool of workers sharing a
+        rate limit.  Returns the number of posts deleted; posts that were already gone when
+        their turn came are logged separately and not counted."""
         with MattermostContext(self) as driver:
             user = driver.users.get_user_by_username(user_name)
-        if not user:
-            self.logger.info(f"[mattermost_api] User {user_name} not found.")
-            return
-        # user_id = user["id"]
-        with MattermostContext(self) as driver:
+            if not user:
+                self.logger.info(f"[mattermost_api] User {user_name} not found.")
+                return 0
             teams = driver.teams.get_teams()
-        team = next((team for team in teams if team["display_name"] == team_name), None)
-        if team is None:
-            self.logger.info(f"[mattermost_api] Team {team_name} not found.")
-            return
-        team_id = team["id"]
-        # WARNING: Don't nest this inside of another with MattermostContext.  This function
-        # itself uses a with and will Logout()
-        user_id = self.get_user_id_by_name(user_name)
-        with MattermostContext(self) as driver:
-            channels = driver.channels.get_channels_for_user(user_id, team_id)
-        if not channels:
-            self.logger.info(
-                f"[mattermost_api] No channels found for team {team_name} and user {user_name}."
+            team = next((team for team in teams if team["display_name"] == team_name), None)
+            if team is None:
+                self.logger.info(f"[mattermost_api] Team {team_name} not found.")
+                return 0
+            team_id = team["id"]
+            channels = driver.channels.get_channels_for_user(user["id"], team_id)
+            if not channels:
+                self.logger.info(
+                    f"[mattermost_api] No channels found for team {team_name} and user {user_name}."
+                )
+                return 0
+            channel = next(
+                (channel for channel in channels if channel["display_name"] == channel_name),
+                None,
             )
-            return
-        channel = next(
-            (channel for channel in channels if channel["display_name"] == channel_name),
-            None,
-        )
-        if channel is None:
+            if channel is None:
+                self.logger.info(
+                    f"[mattermost_api] Channel {channel_name} not found in team {team_name}."
+                )
+                return 0
+            channel_id = channel["id"]
             self.logger.info(
-                f"[mattermost_api] Channel {channel_name} not found in team {team_name}."
+                f"[mattermost_api] Erasing messages in channel {channel_name} (ID: {channel_id}) in team {team_name} (ID: {team_id})"
             )
-            return
-        channel_id = channel["id"]
+            cutoff_ms = (time.time() - age_threshold_seconds) * 1000
+            stale = self._collect_stale_posts(driver, channel_id, cutoff_ms)
+            if not stale:
+                self.logger.info(f"[mattermost_api] No stale messages in channel {channel_name}.")
+                return 0
+            started = time.monotonic()
+            limiter = RateLimiter(max_per_second)
+
+            def delete(post_id):
+                for attempt in range(3):
+                    limiter.acquire()
+                    try:
+                        driver.posts.delete_post(post_id)
+                        return "deleted"
+                    except ResourceNotFound:
+                        # e.g. a reply removed along with its root earlier in this sweep
+                        return "gone"
+                    except Exception as e:
+                        # 429s and transient errors: back off, then give up on this post
+                        self.logger.debug(f"[mattermost_api] delete {post_id} failed: {e}")
+                        if attempt < 2:
+                            time.sleep(2**attempt)
+                return "failed"
+
+            with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+                outcomes = list(pool.map(delete, stale))
+        elapsed = max(time.monotonic() - started, 1e-6)
+        deleted = outcomes.count("deleted")
+        already_gone = outcomes.count("gone")
         self.logger.info(
-            f"[mattermost_api] Erasing messages in channel {channel_name} (ID: {channel_id}) in team {team_name} (ID: {team_id})"
+            f"[mattermost_api] Deleted {deleted}/{len(stale)} post(s) in channel {channel_name} "
+            f"in {elapsed:.1f}s ({deleted / elapsed:.1f} posts/s); {already_gone} already gone"
         )
-        now_timestamp = int(time.time())
-        page_number = 0
+        return deleted
+
+    def _collect_stale_posts(self, driver, channel_id, cutoff_ms, per_page=200):
+        """IDs of posts last updated before cutoff_ms, walking the channel from newest to
+        oldest with `before=<oldest id seen>` as the cursor."""
+        stale = []
+        before = None
         while True:
-            with MattermostContext(self) as driver:
-                posts = driver.posts.get_posts_for_channel(
-                    channel_id, params={"page": page_number, "per_page": 200}
-                )["posts"]
-            if not posts:
-                self.logger.info(
-                    f"[mattermost_api] No more messages found in channel {channel_name}."
-                )
-                return
-            page_number += 1
-            for post_id, post_dict in posts.items():
-                update_at_timestamp = int(post_dict["update_at"] / 1000)
-                age_seconds = now_timestamp - update_at_timestamp
-                if age_seconds > age_threshold_seconds:
-                    self.logger.info(
-                        f"[mattermost_api] Deleting post {post_id} in channel {channel_name} because age in seconds ({age_seconds}) exceeds the threshold ({age_threshold_seconds})."
-                    )
-                    with MattermostContext(self) as driver:
-                        driver.posts.delete_post(post_id)
-            time.sleep(5)
+            params = {"per_page": per_page}
+            if before:
+                params["before"] = before
+            page = driver.posts.get_posts_for_channel(channel_id, params=params)
+            order = page.get("order") or []
+            if not order:
+                return stale
+            posts = page.get("posts", {})
+            for post_id in order:
+                post = posts.get(post_id)
+                if post and post["update_at"] < cutoff_ms:
+                    stale.append(post_id)
+            before = order[-1]
 
     def lookup_channel_by_name(self, channel_name, team_name, user_name):
         with MattermostContext(self) as driver:
@@ -1,7 +1,9 @@
-import json, datetime as dt
+import json, threading, time, datetime as dt
 from typing import Dict, Any, Optional, List
 from util.http import post_json, http_get, post_multipart
-from mattermostdriver import Driver
+from util.channel_resolver import ChannelResolver
+from util.metrics import registry
+from util.profiling import profiler
 
 TOP_FIELDS = [
     "event",
@@ -20,6 +22,21 @@ TOP_FIELDS = [
 ]
 
 
+SEND_SECONDS = registry.histogram(
+    "newsfeeds_send_duration_seconds", "Time to deliver one message", ["kind"]
+)
+SEND_ERRORS = registry.counter(
+    "newsfeeds_send_errors_total", "Delivery attempts that failed", ["kind"]
+)
+DIGEST_ITEMS = registry.counter("newsfeeds_digest_items_total", "Items posted inside digests")
+POSTS_PATCHED = registry.counter(
+    "newsfeeds_posts_patched_total", "Changed items edited into their existing post"
+)
+
+# Mattermost rejects messages longer than 16383 characters; leave room for the header.
+MAX_POST_CHARS = 16000
+
+
 class SafeDict(dict):
     def __missing__(self, key):
         return ""
@@ -45,15 +62,193 @@ def render_fields(item: Dict[str, Any]) -> str:
     return "\n".join(lines) or json.dumps(item, ensure_ascii=False, indent=2)
 
 
+def _patch_post(mattermost_api: "Driver", post_id: str, message: str):
+    """The patched post, or None when it is gone (deleted by hand or by the cleanup source)."""
+    from mattermostdriver.exceptions import InvalidOrMissingParameters, ResourceNotFound
+
+    try:
+        return mattermost_api.posts.patch_post(post_id, {"message": message})
+    except (ResourceNotFound, InvalidOrMissingParameters):
+        return None
+
+
+def deliver_mattermost(mattermost_api: "Driver", body: Dict[str, Any], ledger=None):
+    """Create a post; a "_replies" list in the body is posted as a thread under it.
+
+    With a ledger, a body carrying "_identity" (and optionally the "_supersedes" identities
+    it replaces) edits the post already recorded for it instead of creating a new one.  An
+    edit older ("_version") than the one recorded is dropped, so a retried message cannot
+    roll a post back; an edit does not post its replies again.
+
+    Progress is written back into `body` ("_root_id", "_replies_sent"); the outbox saves it
+    when a later call fails, so a retry carries on where it stopped instead of posting the
+    root and the replies already sent again."""
+    post = {k: v for k, v in body.items() if not k.startswith("_")}
+    replies = body.get("_replies") or []
+    identity = body.get("_identity")
+    supersedes = body.get("_supersedes") or []
+    version = body.get("_version", 0)
+    identities = [identity] + list(supersedes) if identity and ledger is not None else []
+    channel_id = post["channel_id"]
+    try:
+        with SEND_SECONDS.time(kind="mattermost"):
+            root = {"id": body["_root_id"]} if body.get("_root_id") else None
+            found = ledger.find(channel_id, identities) if identities and not root else None
+            if found and found[1] > version:
+                return {"id": found[0]}  # a newer version already went out
+            if found:
+                root = _patch_post(mattermost_api, found[0], post["message"])
+                if root is None:
+                    ledger.forget(found[0])
+                else:
+                    POSTS_PATCHED.inc()
+                    body["_replies_sent"] = len(replies)
+            if root is None:
+                root = mattermost_api.posts.create_post(post)
+            body["_root_id"] = root["id"]
+            for i in range(body.get("_replies_sent", 0), len(replies)):
+                mattermost_api.posts.create_post(
+                    {"channel_id": channel_id, "message": replies[i], "root_id": root["id"]}
+                )
+                body["_replies_sent"] = i + 1
+    except Exception:
+        SEND_ERRORS.inc(kind="mattermost")
+        raise
+    if identities:
+        ledger.record(channel_id, identities, root["id"], version)
+    return root
+
+
+def deliver_webhook(body: Dict[str, Any]):
+    try:
+        with SEND_SECONDS.time(kind="webhook"):
+            return post_json(body["url"], body["payload"])
+    except Exception:
+        SEND_ERRORS.inc(kind="webhook")
+        raise
+
+
+class Digest:
+    """Rendered items waiting to go out as one post to a single channel (or webhook)."""
+
+    def __init__(self, notifier: "Notifier", ocfg: Dict[str, Any]):
+        self.notifier = notifier
+        self.ocfg = ocfg
+        self.opened_at = time.time()
+        self.titles: List[str] = []
+        self.entries: List[str] = []
+        self.held: List[int] = []  # outbox rows keeping the entries across a restart
+
+    def add(self, title: str, text: str):
+        if title not in self.titles:
+            self.titles.append(title)
+        self.entries.append(text)
+
+    def due(self, now: float) -> bool:
+        n = self.notifier
+        return (
+            len(self.entries) >= n.digest_max_items or now - self.opened_at >= n.digest_window
+        )
+
+
+class DigestBuffer:
+    """Process-wide digests keyed by destination, so every non-streaming source that posts
+    to the same channel shares one window.
+
+    The seen store marks an item as soon as it is buffered, so with an outbox each item is
+    also held there until its digest has been enqueued; restore() puts them back after a
+    restart."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._digests: Dict[str, Digest] = {}
+
+    def add(
+        self, key: str, notifier: "Notifier", ocfg, title: str, text: str
+    ) -> Optional[Digest]:
+        """Buffer one rendered item; returns the digest if it just filled up."""
+        with self._lock:
+            d = self._digests.get(key)
+            if d is None:
+                d = self._digests[key] = Digest(notifier, ocfg)
+            d.add(title, text)
+            if notifier.outbox is not None:
+                held = {"ocfg": ocfg, "title": title, "text": text}
+                d.held.append(notifier.outbox.hold(key, held))
+            if len(d.entries) >= notifier.digest_max_items:
+                return self._digests.pop(key)
+        return None
+
+    def take_due(self, force: bool = False) -> List[Digest]:
+        now = time.time()
+        with self._lock:
+            keys = [k for k, d in self._digests.items() if force or d.due(now)]
+            return [self._digests.pop(k) for k in keys]
+
+    def restore(self, outbox, notifiers: List["Notifier"]) -> int:
+        """Re-open the digests whose items were held when the process last stopped."""
+        restored, orphaned = 0, []
+        with self._lock:
+            for held_id, key, body, created in outbox.held():
+                notifier = next(
+                    (
+                        n
+                        for n in notifiers
+                        if not n.stream and n._digest_key(body["ocfg"]) == key
+                    ),
+                    None,
+                )
+                if notifier is None:
+                    orphaned.append(held_id)
+                    continue
+                d = self._digests.get(key)
+                if d is None:
+                    d = self._digests[key] = Digest(notifier, body["ocfg"])
+                d.opened_at = min(d.opened_at, created)
+                d.add(body["title"], body["text"])
+                d.held.append(held_id)
+                restored += 1
+        if orphaned:
+            outbox.logger.warning(
+                f"[Notifier] dropped {len(orphaned)} held digest item(s) with no matching"
+                " digest notifier"
+            )
+            outbox.release(orphaned)
+        if restored:
+            outbox.logger.info(f"[Notifier] restored {restored} digest item(s)")
+        return restored
+
+
+digests = DigestBuffer()
+
+
+def flush_digests(force: bool = False) -> int:
+    """Post every digest whose window has elapsed (all of them with force=True).  Called
+    periodically by the scheduler and once more on shutdown."""
+    sent = 0
+    for d in digests.take_due(force):
+        try:
+            d.notifier.post_digest(d)
+            sent += 1
+        except Exception as e:
+            d.notifier.logger.error(f"[Notifier] digest for {', '.join(d.titles)} failed: {e}")
+    return sent
+
+
 class Notifier:
     def __init__(
         self,
         general_cfg: Dict[str, Any],
         notifier_cfg: Dict[str, Any],
-        mattermost_api: Driver,
+        mattermost_api: "Driver",
         logger,
+        outbox=None,
+        resolver: Optional[ChannelResolver] = None,
+        ledger=None,
     ):
         self.notifier_cfg = notifier_cfg
+        self.outbox = outbox
+        self.ledger = ledger
         self.general_cfg = general_cfg
         self.mattermost_api = mattermost_api
         self.logger = logger
@@ -65,10 +260,14 @@ class Notifier:
         self.stream = bool(notifier_cfg.get("stream", True))
         self.style = (notifier_cfg.get("style") or "markdown").lower()
         self.webhook_url = notifier_cfg.get("webhook_url", "")
+        self.digest_window = float(notifier_cfg.get("digest_window_seconds", 60))
+        self.digest_max_items = max(1, int(notifier_cfg.get("digest_max_items", 25)))
+        self.digest_threaded = bool(notifier_cfg.get("digest_threaded", False))
         self.channel_id = None
         self.base = None
         if self.mattermost_channel != "":
-            self.mattermost_channel_id = self._get_channel_id_by_name(
+            resolver = resolver or ChannelResolver(mattermost_api, logger)
+            self.mattermost_channel_id = resolver.resolve(
                 self.mattermost_channel, self.mattermost_team, self.mattermost_user
             )
         else:
@@ -81,14 +280,13 @@ class Notifier:
         self, title: str, items: List[Dict[str, Any]], template: Optional[str]
     ):
         if self.style == "fields" and items:
-            return render_fields(items[0])
+            return "\n\n".join(render_fields(item) for item in items)
         if template and items:
-            return render_template(template, items[0])
+            return "\n\n".join(render_template(template, item) for item in items)
         if len(items) == 1:
             return json.dumps(items[0], ensure_ascii=False, indent=2)
-        return (
-            f"**{title}**\nReceived {len(items)} items at {self.base.now_local_str()}."
-        )
+        now = self.base.dt_str(self.base.now_dt()) if self.base else dt.datetime.now()
+        return f"**{title}**\nReceived {len(items)} items at {now}."
 
     def send(
         self,
@@ -96,18 +294,76 @@ class Notifier:
         payload: Dict[str, Any],
         override: Optional[Dict[str, Any]] = None,
         template: Optional[str] = None,
+        identity: Optional[str] = None,
+        supersedes: Optional[List[str]] = None,
     ):
+        """Render and deliver `payload`.  `identity` names the item across versions so a
+        streamed Mattermost post can be edited when the item changes; `supersedes` lists
+        identities this item replaces.  Digests and webhooks always post afresh."""
         ocfg = override or {}
+        with profiler.section("send", self.base.name if self.base else title):
+            text = self._compose_text(title, payload.get("items", []), template)
+            if not self.stream:
+                full = digests.add(self._digest_key(ocfg), self, ocfg, title, text)
+                if full is not None:
+                    return full.notifier.post_digest(full)
+                return None
+            return self._deliver(text, ocfg, identity, supersedes)
+
+    def _digest_key(self, ocfg: Dict[str, Any]) -> str:
         t = (ocfg.get("type") or self.type).lower()
         if t == "mattermost":
-            return self._send_mattermost(title, payload, template)
-        else:
-            return self._send_webhook(title, payload, ocfg, template)
+            return f"mattermost|{self.mattermost_channel_id}"
+        return f"webhook|{ocfg.get('webhook_url') or self.webhook_url}"
+
+    def post_digest(self, digest: Digest):
+        """One post for the whole window.  With digest_threaded the items become replies under
+        a short summary post instead (more calls, but a quieter channel)."""
+        n = len(digest.entries)
+        DIGEST_ITEMS.inc(n)
+        header = f"**{' / '.join(digest.titles)} — {n} new**"
+        t = (digest.ocfg.get("type") or self.type).lower()
+        if self.digest_threaded and t == "mattermost":
+            result = self._send_mattermost(header, replies=digest.entries)
+            self._release(digest)
+            return result
+        result = None
+        chunk = header
+        for text in digest.entries:
+            if len(chunk) + len(text) + 2 > MAX_POST_CHARS:
+                result = self._deliver(chunk, digest.ocfg)
+                chunk = header + " (cont.)"
+            chunk += "\n\n" + text[:MAX_POST_CHARS]
+        result = self._deliver(chunk, digest.ocfg)
+        self._release(digest)
+        self.logger.info(f"[Notifier] posted digest of {n} item(s) for {', '.join(digest.titles)}")
+        return result
+
+    def _release(self, digest: Digest):
+        # The digest is in the outbox now; its held items are no longer needed.
+        if digest.held and self.outbox is not None:
+            self.outbox.release(digest.held)
 
-    def _send_mattermost(self, title: str, payload: Dict[str, Any], template):
-        items = payload.get("items", [])
-        text = self._compose_text(title, items, template)
+    def _deliver(
+        self,
+        text: str,
+        ocfg: Dict[str, Any],
+        identity: Optional[str] = None,
+        supersedes: Optional[List[str]] = None,
+    ):
+        t = (ocfg.get("type") or self.type).lower()
+        if t == "mattermost":
+            return self._send_mattermost(text, identity=identity, supersedes=supersedes)
+        else:
+            return self._send_webhook(text, ocfg)
 
+    def _send_mattermost(
+        self,
+        text: str,
+        replies: Optional[List[str]] = None,
+        identity: Optional[str] = None,
+        supersedes: Optional[List[str]] = None,
+    ):
         # {
         # "channel_id": "string",
         # "message": "string",
@@ -124,48 +380,23 @@ class Notifier:
         # }
 
         body = {"channel_id": self.mattermost_channel_id, "message": text}
+        if replies:
+            body["_replies"] = list(replies)
+        if identity:
+            body["_identity"] = identity
+            body["_version"] = time.time_ns()
+            if supersedes:
+                body["_supersedes"] = list(supersedes)
 
-        return self.mattermost_api.posts.create_post(body)
+        if self.outbox is not None:
+            return self.outbox.enqueue("mattermost", self.mattermost_channel_id or "", body)
+        return deliver_mattermost(self.mattermost_api, body, self.ledger)
 
-    def _send_webhook(
-        self,
-        title: str,
-        payload: Dict[str, Any],
-        ocfg: Dict[str, Any],
-        template: Optional[str],
-    ):
+    def _send_webhook(self, text: str, ocfg: Dict[str, Any]):
         webhook_url = ocfg.get("webhook_url") or self.webhook_url
         if not webhook_url:
             return None
-        items = payload.get("items", [])
-        text = self._compose_text(title, items, template)
-        return post_json(webhook_url, {"text": text})
-
-    def _get_channel_id_by_name(self, channel_name, team_name, user_name):
-        user_id = self.mattermost_api.users.get_user_by_username(user_name).get("id")
-        teams = self.mattermost_api.teams.get_user_teams(user_id)
-        team = next((team for team in teams if team["display_name"] == team_name), None)
-        if team is None:
-            self.logger.warning(
-                f"[Notifier] Team {team_name} not found for user {user_name}."
-            )
-            return
-        team_id = team["id"]
-        channels = self.mattermost_api.channels.get_channels_for_user(user_id, team_id)
-        if not channels:
-            self.logger.warning(f"[Notifier] No channels found for team {team_name}.")
-            return
-        channel = next(
-            (
-                channel
-                for channel in channels
-                if channel["display_name"] == channel_name
-            ),
-            None,
-        )
-        if channel is None:
-            self.logger.warning(
-                f"[Notifier] Channel {channel_name} not found in team {team_name}."
-            )
-            return
-        return channel["id"]
+        body = {"url": webhook_url, "payload": {"text": text}}
+        if self.outbox is not None:
+            return self.outbox.enqueue("webhook", webhook_url, body)
+        return deliver_webhook(body)
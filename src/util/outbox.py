@@ -0,0 +1,288 @@
+import json, os, random, sqlite3, threading, time, zlib
+from typing import Any, Callable, Dict, List, Optional
+from util.metrics import registry
+from util.profiling import profiler
+
+OUTBOX_PENDING = registry.gauge("newsfeeds_outbox_pending", "Messages waiting for delivery")
+OUTBOX_DELIVERED = registry.counter("newsfeeds_outbox_delivered_total", "Messages delivered")
+OUTBOX_RETRIES = registry.counter(
+    "newsfeeds_outbox_retries_total", "Failed attempts scheduled for retry"
+)
+OUTBOX_DEAD = registry.counter(
+    "newsfeeds_outbox_dead_total", "Messages given up on after a permanent error"
+)
+OUTBOX_DEAD_ROWS = registry.gauge(
+    "newsfeeds_outbox_dead", "Given-up messages kept in the outbox for inspection"
+)
+OUTBOX_LATENCY = registry.histogram(
+    "newsfeeds_outbox_latency_seconds",
+    "Time from enqueue to successful delivery",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800),
+)
+
+# mattermostdriver raises these without the response attached
+_DRIVER_STATUS = {
+    "InvalidOrMissingParameters": 400,
+    "NoAccessTokenProvided": 401,
+    "NotEnoughPermissions": 403,
+    "ResourceNotFound": 404,
+    "MethodNotAllowed": 405,
+    "ContentTooLarge": 413,
+    "FeatureDisabled": 501,
+}
+
+
+def http_status(err: BaseException) -> Optional[int]:
+    """The HTTP status behind a delivery error (following its causes), or None."""
+    while err is not None:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+        if status is None:
+            status = _DRIVER_STATUS.get(type(err).__name__)
+        if status is not None:
+            return status
+        err = err.__cause__
+    return None
+
+
+def permanent(err: BaseException) -> bool:
+    """Whether retrying cannot help: the server refused the message itself (a 4xx other
+    than request timeout and rate limiting)."""
+    status = http_status(err)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class Outbox:
+    """Durable queue between the sources and Mattermost.
+
+    `enqueue()` commits the rendered message to SQLite and returns immediately, so a poll
+    never waits on the chat server.  A small pool of worker threads drains the table and
+    deletes a row only once its sender succeeded; failures are retried with exponential
+    backoff, capped at `max_backoff_seconds`, for as long as they look transient.  Rows
+    are sharded across workers by destination key so posts to one channel go out in
+    order (a failing message is retried later without holding back the rest).
+    A sender may record progress in the body it is handed; the body of a failed row is
+    saved back, so the retry resumes from there.  Anything still queued at shutdown stays
+    on disk for the next start.  A row is given up on only after a permanent error (see
+    `permanent()`); given-up rows are kept for `dead_retention_days`.
+
+    The `held` table keeps items that are waiting in a digest window, so a restart does
+    not lose them (see DigestBuffer).
+    """
+
+    def __init__(self, path: str, logger, cfg: Optional[Dict[str, Any]] = None):
+        cfg = cfg or {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.logger = logger
+        self.workers = max(1, int(cfg.get("workers", 2)))
+        self.base_backoff = float(cfg.get("base_backoff_seconds", 2))
+        self.max_backoff = float(cfg.get("max_backoff_seconds", 300))
+        self.dead_retention = float(cfg.get("dead_retention_days", 7)) * 86400
+        self.senders: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " dest TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt REAL NOT NULL,"
+            " created REAL NOT NULL,"
+            " dead INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT"
+            ")"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS held ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " created REAL NOT NULL"
+            ")"
+        )
+        self.conn.commit()
+        self.conn.create_function(
+            "shard", 1, lambda dest: zlib.crc32(dest.encode("utf-8")) % self.workers
+        )
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self.delivered = 0
+        self.failed = 0
+        OUTBOX_PENDING.set_function(self.pending)
+        OUTBOX_DEAD_ROWS.set_function(self.dead)
+
+    def register(self, kind: str, sender: Callable[[Dict[str, Any]], Any]) -> None:
+        self.senders[kind] = sender
+
+    def start(self) -> None:
+        self.purge_dead()
+        pending = self.pending()
+        if pending:
+            self.logger.info(f"[Outbox] resuming with {pending} undelivered message(s)")
+        dead = self.dead()
+        if dead:
+            self.logger.warning(
+                f"[Outbox] {dead} undeliverable message(s) kept in {self.path} (table outbox,"
+                " dead=1)"
+            )
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._worker, args=(i,), name=f"Outbox-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
+    def enqueue(self, kind: str, dest: str, body: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._cond:
+            cur = self.conn.execute(
+                "INSERT INTO outbox (kind, dest, body, next_attempt, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (kind, dest, json.dumps(body, ensure_ascii=False), now, now),
+            )
+            self.conn.commit()
+            self._cond.notify_all()
+        return cur.lastrowid
+
+    def pending(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE dead=0").fetchone()[0]
+
+    def dead(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE dead=1").fetchone()[0]
+
+    def purge_dead(self) -> int:
+        """Delete given-up rows older than dead_retention_days (their last attempt)."""
+        with self._lock:
+            cur = self.conn.execute(
+                "DELETE FROM outbox WHERE dead=1 AND next_attempt<?",
+                (time.time() - self.dead_retention,),
+            )
+            self.conn.commit()
+        if cur.rowcount:
+            self.logger.info(f"[Outbox] purged {cur.rowcount} dead message(s)")
+        return cur.rowcount
+
+    def hold(self, key: str, body: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO held (key, body, created) VALUES (?, ?, ?)",
+                (key, json.dumps(body, ensure_ascii=False), now),
+            )
+            self.conn.commit()
+        return cur.lastrowid
+
+    def held(self) -> List[tuple]:
+        """(id, key, body, created) of every held item, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, key, body, created FROM held ORDER BY id"
+            ).fetchall()
+        return [(i, key, json.loads(body), created) for i, key, body, created in rows]
+
+    def release(self, ids: List[int]) -> None:
+        with self._lock:
+            self.conn.executemany("DELETE FROM held WHERE id=?", [(i,) for i in ids])
+            self.conn.commit()
+
+    def _claim(self, shard: int):
+        """Oldest due row for this shard, or (None, seconds until the next one is due)."""
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT id, kind, body, attempts, created FROM outbox"
+            " WHERE dead=0 AND next_attempt<=? AND shard(dest)=? ORDER BY id LIMIT 1",
+            (now, shard),
+        ).fetchone()
+        if row is not None:
+            return row, None
+        nxt = self.conn.execute(
+            "SELECT MIN(next_attempt) FROM outbox WHERE dead=0 AND shard(dest)=?", (shard,)
+        ).fetchone()[0]
+        return None, (None if nxt is None else max(0.0, nxt - now))
+
+    def _worker(self, shard: int) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    row, wait = self._claim(shard)
+                    if row is not None:
+                        break
+                    self._cond.wait(timeout=wait)
+            msg_id, kind, body, attempts, created = row
+            payload = json.loads(body)
+            try:
+                sender = self.senders[kind]
+                with profiler.section("deliver", kind):
+                    sender(payload)
+            except Exception as e:
+                self._failed(msg_id, attempts + 1, e, payload)
+            else:
+                with self._cond:
+                    self.conn.execute("DELETE FROM outbox WHERE id=?", (msg_id,))
+                    self.conn.commit()
+                    self.delivered += 1
+                    self._cond.notify_all()
+                OUTBOX_DELIVERED.inc()
+                OUTBOX_LATENCY.observe(time.time() - created)
+
+    def _failed(
+        self, msg_id: int, attempts: int, err: Exception, payload: Dict[str, Any]
+    ) -> None:
+        self.failed += 1
+        dead = permanent(err)
+        delay = min(self.max_backoff, self.base_backoff * 2 ** min(attempts - 1, 32))
+        delay *= random.uniform(0.8, 1.2)
+        with self._cond:
+            self.conn.execute(
+                "UPDATE outbox SET attempts=?, next_attempt=?, dead=?, last_error=?, body=?"
+                " WHERE id=?",
+                (
+                    attempts,
+                    time.time() + delay,
+                    int(dead),
+                    str(err),
+                    json.dumps(payload, ensure_ascii=False),
+                    msg_id,
+                ),
+            )
+            self.conn.commit()
+        (OUTBOX_DEAD if dead else OUTBOX_RETRIES).inc()
+        if dead:
+            self.logger.error(
+                f"[Outbox] giving up on message {msg_id} after {attempts} attempt(s): {err}"
+            )
+        else:
+            self.logger.warning(
+                f"[Outbox] delivery of message {msg_id} failed ({err}); retry in {delay:.0f}s"
+            )
+
+    def close(self, flush_timeout: float = 10.0) -> None:
+        """Give the workers up to `flush_timeout` seconds to drain what is due, then stop.
+        Undelivered rows stay in the database and are resumed on the next start."""
+        deadline = time.time() + flush_timeout
+        with self._cond:
+            while time.time() < deadline:
+                due = self.conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE dead=0 AND next_attempt<=?",
+                    (time.time(),),
+                ).fetchone()[0]
+                if not due:
+                    break
+                self._cond.wait(timeout=max(0.0, deadline - time.time()))
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+        left = self.pending()
+        if left:
+            self.logger.info(f"[Outbox] {left} message(s) checkpointed for the next start")
+        self.conn.close()
@@ -0,0 +1,76 @@
+import multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from util.metrics import registry
+
+PARSE_JOBS = registry.counter(
+    "newsfeeds_parse_jobs_total", "Parse jobs by where they ran", ["fn", "where"]
+)
+
+
+class ParsePool:
+    """Runs CPU-bound parsers (KML, BeautifulSoup) in worker processes so a large payload
+    doesn't hold the GIL against the scheduler and the WS-5000 listener.
+
+    `run(fn, *args, size=...)` calls a module-level function with picklable arguments and
+    returns its result.  Payloads under `inline_below_bytes`, or any call while
+    `workers` is 0, run in-process, since pickling them costs more than parsing.  The pool
+    is started on first use and its workers stay up across polls; if a worker dies the
+    call falls back to in-process parsing and the pool is rebuilt next time.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.inline_below_bytes = 256 * 1024
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.logger = None
+
+    def configure(self, cfg, logger=None):
+        self.workers = max(0, int(cfg.get("workers", 2)))
+        self.inline_below_bytes = int(cfg.get("inline_below_bytes", 256 * 1024))
+        self.logger = logger
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # fork would copy the scheduler's threads and locks into the workers
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+                if self.logger:
+                    self.logger.info(f"[ParsePool] started {self.workers} parse worker(s)")
+            return self._executor
+
+    def offloads(self, size: int) -> bool:
+        """Whether a payload of `size` bytes would go to a worker process."""
+        return self.workers > 0 and size >= self.inline_below_bytes
+
+    def run(self, fn: Callable[..., Any], *args, size: int = 0) -> Any:
+        name = getattr(fn, "__name__", "parse")
+        if not self.offloads(size):
+            PARSE_JOBS.inc(fn=name, where="inline")
+            return fn(*args)
+        try:
+            result = self._pool().submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            if self.logger:
+                self.logger.error(f"[ParsePool] worker died ({e}); parsing in-process")
+            with self._lock:
+                self._executor = None
+            PARSE_JOBS.inc(fn=name, where="inline")
+            return fn(*args)
+        PARSE_JOBS.inc(fn=name, where="pool")
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+parse_pool = ParsePool()
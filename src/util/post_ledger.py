@@ -0,0 +1,94 @@
+import os, sqlite3, threading, time
+from typing import Iterable, Optional, Tuple
+from util.metrics import registry
+
+LEDGER_ENTRIES = registry.gauge("newsfeeds_post_ledger_entries", "Identities with a known post")
+
+
+class PostLedger:
+    """Which Mattermost post each item identity went out as, so a changed item can be
+    patched in place instead of posted again.
+
+    Rows are keyed by (channel_id, identity); one post may be recorded under several
+    identities when an update supersedes earlier ones (NWS `references`).  Each row keeps
+    the version (send time) of the message that last wrote it, so a retried older message
+    cannot overwrite a newer one.  Rows older than `ttl_days` are purged, after which an
+    update to that item simply gets a new post.
+    """
+
+    def __init__(self, path: str, ttl_days: float = 7, logger=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = float(ttl_days) * 86400
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            " channel_id TEXT NOT NULL,"
+            " identity TEXT NOT NULL,"
+            " post_id TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (channel_id, identity)"
+            ") WITHOUT ROWID"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(posts)")]
+        if "version" not in columns:
+            self.conn.execute("ALTER TABLE posts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS posts_updated ON posts (updated)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS posts_post_id ON posts (post_id)")
+        self.conn.commit()
+        LEDGER_ENTRIES.set_function(self.count)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def find(self, channel_id: str, identities: Iterable[str]) -> Optional[Tuple[str, int]]:
+        """(post id, version) recorded for the first of `identities` that has one."""
+        with self._lock:
+            for identity in identities:
+                row = self.conn.execute(
+                    "SELECT post_id, version FROM posts WHERE channel_id = ? AND identity = ?",
+                    (channel_id, identity),
+                ).fetchone()
+                if row:
+                    return row[0], row[1]
+        return None
+
+    def record(self, channel_id: str, identities: Iterable[str], post_id: str, version: int = 0):
+        """Point `identities` at `post_id`, except where a newer version is recorded."""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO posts (channel_id, identity, post_id, updated, version)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (channel_id, identity) DO UPDATE SET"
+                " post_id = excluded.post_id, updated = excluded.updated,"
+                " version = excluded.version WHERE excluded.version >= posts.version",
+                [(channel_id, identity, post_id, now, version) for identity in identities],
+            )
+            self.conn.commit()
+
+    def forget(self, post_id: str):
+        """Drop every identity pointing at a post that no longer exists."""
+        with self._lock:
+            self.conn.execute("DELETE FROM posts WHERE post_id = ?", (post_id,))
+            self.conn.commit()
+
+    def purge_old(self) -> int:
+        with self._lock:
+            cur = self.conn.execute(
+                "DELETE FROM posts WHERE updated < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.conn.commit()
+        if cur.rowcount and self.logger:
+            self.logger.info(f"[PostLedger] expired {cur.rowcount} row(s)")
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,144 @@
+import cProfile, io, os, pstats, re, signal, threading, time, tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class Profiler:
+    """Opt-in cProfile and tracemalloc hooks around polls and deliveries.
+
+    While disabled `section()` costs one attribute check.  When enabled, each section runs
+    under its own accumulating cProfile.Profile keyed by `<kind>-<name>` (e.g.
+    `poll-CalTrans`); only one section is profiled at a time, and a section that finds the
+    profiler busy simply runs unprofiled rather than waiting.  `flush()` writes a `.prof`
+    (for snakeviz/pstats) and a `.txt` summary per key to `out_dir`.
+
+    `snapshot_memory()` starts tracemalloc on first use and writes the top allocation sites
+    plus the diff against the previous snapshot, which is how slow growth shows up.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.out_dir: Optional[str] = None
+        self.logger = None
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._calls: Dict[str, int] = {}
+        self._mem: Dict[str, Dict[str, int]] = {}
+        self._dirty = False
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def configure(self, out_dir: str, logger, enabled: bool = False):
+        self.out_dir = out_dir
+        self.logger = logger
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        self.enabled = True
+        if self.logger:
+            self.logger.info(f"[Profiler] profiling enabled; reports go to {self.out_dir}")
+
+    def disable(self):
+        self.enabled = False
+        self.flush()
+        if self.logger:
+            self.logger.info("[Profiler] profiling disabled")
+
+    def toggle(self):
+        self.disable() if self.enabled else self.enable()
+
+    @contextmanager
+    def section(self, kind: str, name: str):
+        if not self.enabled or not self._lock.acquire(blocking=False):
+            yield
+            return
+        key = re.sub(r"[^\w.-]+", "_", f"{kind}-{name}")
+        tracing = tracemalloc.is_tracing()
+        try:
+            prof = self._profiles.get(key)
+            if prof is None:
+                prof = self._profiles[key] = cProfile.Profile()
+            if tracing:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+                self._calls[key] = self._calls.get(key, 0) + 1
+                if tracing:
+                    current, peak = tracemalloc.get_traced_memory()
+                    mem = self._mem.setdefault(key, {"net": 0, "peak": 0})
+                    mem["net"] += current - before
+                    mem["peak"] = max(mem["peak"], peak - before)
+                self._dirty = True
+        finally:
+            self._lock.release()
+
+    def flush(self):
+        """Write the accumulated reports; a no-op when nothing new was profiled."""
+        if not self._dirty or not self.out_dir:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        with self._lock:
+            self._dirty = False
+            for key, prof in self._profiles.items():
+                prof.dump_stats(os.path.join(self.out_dir, f"{key}.prof"))
+                buf = io.StringIO()
+                buf.write(f"{key}: {self._calls.get(key, 0)} profiled call(s)\n")
+                mem = self._mem.get(key)
+                if mem:
+                    buf.write(
+                        f"memory: net {mem['net'] / 1024:.1f} KiB, "
+                        f"worst peak {mem['peak'] / 1024:.1f} KiB per call\n"
+                    )
+                buf.write("\n")
+                pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+                with open(os.path.join(self.out_dir, f"{key}.txt"), "w", encoding="utf-8") as f:
+                    f.write(buf.getvalue())
+        if self.logger:
+            self.logger.info(f"[Profiler] wrote {len(self._profiles)} report(s) to {self.out_dir}")
+
+    def snapshot_memory(self, limit: int = 30):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            if self.logger:
+                self.logger.info("[Profiler] tracemalloc started; snapshot again later for a diff")
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ]
+        )
+        os.makedirs(self.out_dir or ".", exist_ok=True)
+        path = os.path.join(self.out_dir or ".", f"memory-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"traced: {current / 1048576:.1f} MiB (peak {peak / 1048576:.1f} MiB)\n\n")
+            f.write(f"top {limit} allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:limit]:
+                f.write(f"  {stat}\n")
+            if self._last_snapshot is not None:
+                f.write(f"\ntop {limit} changes since the previous snapshot:\n")
+                for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:limit]:
+                    f.write(f"  {stat}\n")
+        self._last_snapshot = snapshot
+        if self.logger:
+            self.logger.info(f"[Profiler] memory snapshot written to {path}")
+        return path
+
+    def install_signal_handlers(self):
+        """SIGUSR1 toggles profiling (a report is written when it turns off); SIGUSR2 takes
+        a memory snapshot.  The work runs on a short-lived thread, not in the handler."""
+
+        def run(fn):
+            return lambda signum, frame: threading.Thread(target=fn, daemon=True).start()
+
+        for name, fn in (("SIGUSR1", self.toggle), ("SIGUSR2", self.snapshot_memory)):
+            sig = getattr(signal, name, None)
+            if sig is not None:
+                signal.signal(sig, run(fn))
+
+
+profiler = Profiler()
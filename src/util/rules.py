@@ -0,0 +1,152 @@
+import math, operator, threading, time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from util.metrics import registry
+
+RULES_FIRED = registry.counter(
+    "newsfeeds_rules_fired_total", "Rule transitions that produced a post", ["rule", "state"]
+)
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "in": lambda value, options: value in options,
+}
+
+
+class Rule:
+    """One rule from a source's `rules` list.
+
+    - `above` / `below`: `field` crosses `threshold`.  The rule stays active until the value
+      passes back over `clear_at` (defaults to `threshold`; set it lower for `above`,
+      higher for `below`, to get hysteresis).
+    - `drop` / `rise`: `field` fell / rose by more than `threshold` from its highest /
+      lowest value in the last `window_minutes`, tracked with a monotonic deque so each
+      reading costs amortized O(1).  Clears like `above`.
+    - `match`: every condition in `when` ({field: {op: value}}) holds.  Stateless: each
+      matching item fires, for event streams such as quakes and alerts.
+
+    A rule fires only on the transition into its active state, and not again within
+    `cooldown_minutes` of the last time it fired.  `notify_clear` also reports the
+    transition back out.
+    """
+
+    KINDS = ("above", "below", "drop", "rise", "match")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.kind = spec.get("kind", "above")
+        if self.kind not in self.KINDS:
+            raise ValueError(f"rule {self.name}: unknown kind {self.kind!r}")
+        self.field = spec.get("field")
+        self.threshold = float(spec.get("threshold", 0))
+        self.clear_at = float(spec.get("clear_at", self.threshold))
+        self.window = float(spec.get("window_minutes", 60)) * 60
+        self.cooldown = float(spec.get("cooldown_minutes", 0)) * 60
+        self.notify_clear = bool(spec.get("notify_clear", False))
+        self.message = spec.get("message") or self.name
+        self.when = [
+            (field, OPERATORS[op], target)
+            for field, conds in (spec.get("when") or {}).items()
+            for op, target in conds.items()
+        ]
+        if self.kind == "match" and not self.when:
+            raise ValueError(f"rule {self.name}: a match rule needs `when` conditions")
+        if self.kind != "match" and not self.field:
+            raise ValueError(f"rule {self.name}: needs a `field`")
+        self.active = False
+        self.last_fired = -math.inf
+        self._extremes: "deque[tuple]" = deque()
+
+    def _windowed(self, value: float, ts: float) -> float:
+        """How far `value` has moved from the window's extreme (max for drop, min for rise)."""
+        ext = self._extremes
+        if self.kind == "drop":
+            while ext and ext[-1][1] <= value:
+                ext.pop()
+        else:
+            while ext and ext[-1][1] >= value:
+                ext.pop()
+        ext.append((ts, value))
+        while ext[0][0] < ts - self.window:
+            ext.popleft()
+        return ext[0][1] - value if self.kind == "drop" else value - ext[0][1]
+
+    def _matches(self, record: Dict[str, Any]) -> bool:
+        for field, op, target in self.when:
+            value = record.get(field)
+            if value is None:
+                return False
+            try:
+                if not op(value, target):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _fire(self, ts: float, value, state: str) -> Dict[str, Any]:
+        if state == "fired":
+            self.last_fired = ts
+        RULES_FIRED.inc(rule=self.name, state=state)
+        return {"rule": self.name, "state": state, "value": value, "message": self.message}
+
+    def evaluate(self, record: Dict[str, Any], ts: float) -> Optional[Dict[str, Any]]:
+        if self.kind == "match":
+            if self._matches(record) and ts - self.last_fired >= self.cooldown:
+                return self._fire(ts, None, "fired")
+            return None
+        raw = record.get(self.field)
+        if raw is None:
+            return None
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            return None
+        if self.kind in ("drop", "rise"):
+            value = self._windowed(value, ts)
+        if self.kind == "below":
+            triggered, cleared = value < self.threshold, value >= self.clear_at
+        else:
+            triggered, cleared = value > self.threshold, value <= self.clear_at
+        if not self.active and triggered:
+            self.active = True
+            if ts - self.last_fired >= self.cooldown:
+                return self._fire(ts, value, "fired")
+        elif self.active and cleared:
+            self.active = False
+            if self.notify_clear:
+                return self._fire(ts, value, "cleared")
+        return None
+
+
+class RuleSet:
+    """A source's rules, evaluated together on each record: O(rules) per record, with no
+    look back over earlier records."""
+
+    def __init__(self, specs: List[Dict[str, Any]]):
+        self.rules = [Rule(spec) for spec in specs]
+        self._lock = threading.Lock()
+
+    def evaluate(
+        self, record: Dict[str, Any], ts: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """The transitions this record caused (empty when nothing is worth posting)."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            events = [rule.evaluate(record, ts) for rule in self.rules]
+        return [e for e in events if e is not None]
+
+
+def describe(events: List[Dict[str, Any]]) -> str:
+    """One line for the `alert` template field, e.g. "Gust over 35 mph (41.2)"."""
+    parts = []
+    for e in events:
+        text = e["message"] if e["state"] == "fired" else f"{e['message']} cleared"
+        if e["value"] is not None:
+            text += f" ({e['value']:.4g})"
+        parts.append(text)
+    return "; ".join(parts)
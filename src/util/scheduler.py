@@ -0,0 +1,164 @@
+import asyncio, heapq, inspect, itertools, signal, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class Scheduler:
+    """Event-loop scheduler.  Sources sit in a min-heap keyed on `next_due`; the loop sleeps
+    until the earliest deadline (or until a finished poll pushes an earlier one), then starts
+    every due source as its own task.  At most `max_concurrency` polls run at once and each
+    one is abandoned after `poll_timeout_seconds`.  A worker thread cannot be interrupted,
+    so an abandoned threaded poll keeps its concurrency slot until its thread returns."""
+
+    def __init__(self, sources, seen, logger, cfg: Dict[str, Any]):
+        self.sources = sources
+        self.seen = seen
+        self.logger = logger
+        self.max_concurrency = max(1, int(cfg.get("max_concurrency", 4)))
+        self.poll_timeout = float(cfg.get("poll_timeout_seconds", 120))
+        self.purge_seconds = float(cfg.get("purge_seconds", 300))
+        self._periodic: List[Tuple[float, Callable[[], Any]]] = [
+            (self.purge_seconds, self.seen.purge_old)
+        ]
+        self._on_start: List[Callable[[], Any]] = []
+        self._on_stop: List[Callable[[], Any]] = []
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency * 2, thread_name_prefix="poll"
+        )
+        self._sem: asyncio.Semaphore = None
+        self._wakeup: asyncio.Event = None
+        self._stopping: asyncio.Event = None
+        self._tasks = set()
+        self.orphaned = 0
+
+    def add_periodic(self, interval: float, fn: Callable[[], Any]) -> None:
+        """Run `fn` on the poll executor every `interval` seconds while the loop runs."""
+        self._periodic.append((float(interval), fn))
+
+    def on_start(self, fn: Callable[[], Any]) -> None:
+        """Run `fn` once on the loop, right after the first due polls have been started."""
+        self._on_start.append(fn)
+
+    def on_stop(self, fn: Callable[[], Any]) -> None:
+        """Run `fn` once after the loop exits and in-flight polls have finished."""
+        self._on_stop.append(fn)
+
+    def _push(self, source) -> None:
+        heapq.heappush(self._heap, (source.next_due, next(self._seq), source))
+
+    async def run(self) -> None:
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        for s in self.sources:
+            self._push(s)
+        housekeeping = [asyncio.create_task(self._every(i, fn)) for i, fn in self._periodic]
+        self.logger.info(
+            f"Scheduler started ({len(self.sources)} source(s), "
+            f"concurrency {self.max_concurrency})."
+        )
+        started = False
+        try:
+            while not self._stopping.is_set():
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, source = heapq.heappop(self._heap)
+                    task = asyncio.create_task(self._run_source(source))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                if not started:
+                    started = True
+                    for fn in self._on_start:
+                        try:
+                            fn()
+                        except Exception as e:
+                            self.logger.exception(f"Error in startup hook: {e}")
+                timeout = (self._heap[0][0] - now) if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in housekeeping:
+                task.cancel()
+            if self._tasks:
+                await asyncio.wait(self._tasks, timeout=self.poll_timeout)
+            for fn in self._on_stop:
+                try:
+                    await loop.run_in_executor(self._executor, fn)
+                except Exception as e:
+                    self.logger.exception(f"Error during shutdown: {e}")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self) -> None:
+        """Ask the loop to exit after in-flight polls finish (installed for SIGTERM/SIGINT).
+        Safe to call from the loop only; use `loop.call_soon_threadsafe(scheduler.stop)`
+        elsewhere."""
+        if self._stopping is not None and not self._stopping.is_set():
+            self.logger.info("Scheduler stopping.")
+            self._stopping.set()
+            self._wakeup.set()
+
+    def _orphan_done(self, source, poll: asyncio.Task) -> None:
+        self.orphaned -= 1
+        self._sem.release()
+        if not poll.cancelled() and poll.exception() is not None:
+            self.logger.error(f"Abandoned poll of {source.name} failed: {poll.exception()}")
+        self.logger.info(
+            f"Abandoned poll of {source.name} finished ({self.orphaned} still running)"
+        )
+
+    async def _run_source(self, source) -> None:
+        loop = asyncio.get_running_loop()
+        new_count = None
+        skipped = False
+        await self._sem.acquire()
+        poll = asyncio.ensure_future(source.apoll(time.time(), self._executor))
+        try:
+            done, _ = await asyncio.wait({poll}, timeout=self.poll_timeout)
+            if done:
+                new_count = poll.result()
+                skipped = new_count is None
+            else:
+                if inspect.iscoroutinefunction(source.poll):
+                    poll.cancel()
+                self.orphaned += 1
+                poll.add_done_callback(lambda t: self._orphan_done(source, t))
+                self.logger.error(
+                    f"Polling {source.name} timed out after {self.poll_timeout:.0f}s; "
+                    f"{self.orphaned} abandoned poll(s) still hold a slot"
+                )
+        except Exception as e:
+            self.logger.exception(f"Error polling {source.name}: {e}")
+        finally:
+            if poll.done():
+                self._sem.release()
+            if not skipped:
+                await loop.run_in_executor(self._executor, self.seen.commit)
+        if skipped:
+            # Nothing was polled: keep the backoff and retry once the minimum has passed.
+            source.next_due = time.time() + source.min_poll_seconds
+        else:
+            source.schedule_next(new_count)
+        if not self._stopping.is_set():
+            self._push(source)
+            self._wakeup.set()
+
+    async def _every(self, interval: float, fn: Callable[[], Any]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(self._executor, fn)
+            except Exception as e:
+                name = getattr(fn, "__name__", fn)
+                self.logger.exception(f"Error in periodic task {name}: {e}")
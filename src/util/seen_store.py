@@ -1,45 +1,325 @@
-import json, time, os
-from typing import Dict
+import heapq, json, os, re, sqlite3, threading, time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from util.metrics import registry
+
+SEEN_LOOKUPS = registry.counter(
+    "newsfeeds_seen_lookups_total", "is_seen() calls by result", ["bucket", "result"]
+)
+SEEN_COMMIT_SECONDS = registry.histogram(
+    "newsfeeds_seen_commit_duration_seconds", "Time to write one batch of fingerprints"
+)
+SEEN_WRITTEN = registry.counter("newsfeeds_seen_written_total", "Fingerprints committed")
+SEEN_EXPIRED = registry.counter("newsfeeds_seen_expired_total", "Fingerprints purged by TTL")
+
+WHEEL_SLOT_SECONDS = 3600
+
+
+def _atomic_write_json(path: str, data) -> None:
+    """Write JSON to a temp file, fsync it and rename it over `path` so a crash never
+    leaves a truncated file behind."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ExpiryWheel:
+    """Time wheel of per-hour slots with a min-heap of slot numbers, so expiry only visits
+    slots that started before the cutoff instead of every fingerprint."""
+
+    def __init__(self, slot_seconds: int = WHEEL_SLOT_SECONDS):
+        self.slot_seconds = slot_seconds
+        self._slots: Dict[int, Set[Tuple[str, str]]] = {}
+        self._heap: List[int] = []
+
+    def add(self, bucket: str, fingerprint: str, ts: int) -> None:
+        slot = ts // self.slot_seconds
+        keys = self._slots.get(slot)
+        if keys is None:
+            keys = self._slots[slot] = set()
+            heapq.heappush(self._heap, slot)
+        keys.add((bucket, fingerprint))
+
+    def pop_candidates(self, cutoff: int) -> List[Tuple[str, str]]:
+        """Remove and return every key in a slot that began before `cutoff`.  The newest of
+        those slots may hold live entries; callers re-add what has not actually expired."""
+        out: List[Tuple[str, str]] = []
+        while self._heap and self._heap[0] * self.slot_seconds < cutoff:
+            out.extend(self._slots.pop(heapq.heappop(self._heap)))
+        return out
+
+
+class SqliteSeenBackend:
+    """SQLite (WAL) backend.  The (bucket, fingerprint) clustered primary key keeps each
+    bucket in its own contiguous key range, so lookups never touch other buckets."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " bucket TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " ts INTEGER NOT NULL,"
+            " PRIMARY KEY (bucket, fingerprint)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS seen_ts ON seen (ts)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.conn.commit()
+        self._oldest: Optional[int] = self._min_ts()
+
+    def _min_ts(self) -> Optional[int]:
+        return self.conn.execute("SELECT MIN(ts) FROM seen").fetchone()[0]
+
+    def contains(self, bucket: str, fingerprint: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM seen WHERE bucket=? AND fingerprint=?", (bucket, fingerprint)
+        ).fetchone()
+        return row is not None
+
+    def read_meta(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def write(self, entries: Dict[str, Dict[str, int]], meta: Dict[str, str] = None) -> None:
+        rows = [(b, fp, ts) for b, mp in entries.items() for fp, ts in mp.items()]
+        if not rows and not meta:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO seen (bucket, fingerprint, ts) VALUES (?, ?, ?)", rows
+            )
+            if meta:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items()
+                )
+        if not rows:
+            return
+        newest_min = min(ts for _, _, ts in rows)
+        if self._oldest is None or newest_min < self._oldest:
+            self._oldest = newest_min
+
+    def purge(self, cutoff: int) -> int:
+        # The cached MIN(ts) answers the common "nothing expired yet" case without a query;
+        # otherwise the ts index limits the delete to the expired rows.
+        if self._oldest is None or self._oldest >= cutoff:
+            return 0
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM seen WHERE ts < ?", (cutoff,))
+        self._oldest = self._min_ts()
+        return cur.rowcount
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class JsonSeenBackend:
+    """One JSON file per bucket under a directory.  Shards are loaded lazily and only the
+    buckets touched by a commit are rewritten (atomically)."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._shards: Dict[str, Dict[str, int]] = {}
+        self._wheel: Optional[ExpiryWheel] = None
+
+    def _shard_path(self, bucket: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", bucket) + ".json")
+
+    def _shard(self, bucket: str) -> Dict[str, int]:
+        mp = self._shards.get(bucket)
+        if mp is None:
+            mp = {}
+            path = self._shard_path(bucket)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        mp = json.load(f)
+                except Exception:
+                    mp = {}
+            self._shards[bucket] = mp
+            if self._wheel is not None:
+                for fp, ts in mp.items():
+                    self._wheel.add(bucket, fp, ts)
+        return mp
+
+    def _build_wheel(self) -> ExpiryWheel:
+        # Built on the first purge; every shard loaded afterwards feeds it in _shard().
+        self._wheel = ExpiryWheel()
+        for bucket, mp in self._shards.items():
+            for fp, ts in mp.items():
+                self._wheel.add(bucket, fp, ts)
+        for fn in os.listdir(self.directory):
+            if fn.endswith(".json"):
+                self._shard(fn[: -len(".json")])
+        return self._wheel
+
+    def contains(self, bucket: str, fingerprint: str) -> bool:
+        return fingerprint in self._shard(bucket)
+
+    def _meta_path(self) -> str:
+        # not *.json, so the shard scan in _build_wheel never mistakes it for a bucket
+        return os.path.join(self.directory, "_meta.kv")
+
+    def read_meta(self) -> Dict[str, str]:
+        try:
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def write(self, entries: Dict[str, Dict[str, int]], meta: Dict[str, str] = None) -> None:
+        if meta:
+            _atomic_write_json(self._meta_path(), {**self.read_meta(), **meta})
+        for bucket, mp in entries.items():
+            shard = self._shard(bucket)
+            shard.update(mp)
+            if self._wheel is not None:
+                for fp, ts in mp.items():
+                    self._wheel.add(bucket, fp, ts)
+            _atomic_write_json(self._shard_path(bucket), shard)
+
+    def purge(self, cutoff: int) -> int:
+        wheel = self._wheel or self._build_wheel()
+        dirty: Set[str] = set()
+        removed = 0
+        for bucket, fp in wheel.pop_candidates(cutoff):
+            mp = self._shards[bucket]
+            ts = mp.get(fp)
+            if ts is None:
+                continue
+            if ts < cutoff:
+                del mp[fp]
+                dirty.add(bucket)
+                removed += 1
+            else:
+                wheel.add(bucket, fp, ts)
+        for bucket in dirty:
+            _atomic_write_json(self._shard_path(bucket), self._shards[bucket])
+        return removed
+
+    def close(self) -> None:
+        pass
+
+
+BACKENDS = {"sqlite": (SqliteSeenBackend, ".db"), "json": (JsonSeenBackend, ".d")}
+
 
 class SeenStore:
-    def __init__(self, path: str, ttl_days: int = 7):
-        self.path=path
-        self.ttl_seconds=int(ttl_days*86400)
-        self.data: Dict[str, Dict[str,int]]={}; self._load()
+    """Fingerprints already posted, per bucket.
 
-    def _load(self):
-        if os.path.exists(self.path):
-            try:
-                with open(self.path,"r",encoding="utf-8") as f: self.data=json.load(f)
-            except Exception: 
-                self.data={}
-        else: 
-            self.data={}
+    `mark_seen`/`mark_seen_many` only buffer; `commit()` writes everything marked since the
+    last commit in one transaction (the scheduler commits once per poll).  `path` names the
+    store without caring about the extension: the sqlite backend uses `<stem>.db`, the json
+    backend `<stem>.d/`, and a legacy whole-file `<stem>.json` is migrated on first start.
+    """
+
+    def __init__(self, path: str, ttl_days: int = 7, backend: str = "sqlite", logger=None):
+        self.ttl_seconds = int(ttl_days * 86400)
+        self.logger = logger
+        stem = os.path.splitext(path)[0]
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown seen store backend: {backend}")
+        cls, suffix = BACKENDS[backend]
+        self.path = stem + suffix
+        self.backend = cls(self.path)
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._meta: Dict[str, str] = self.backend.read_meta()
+        self._pending_meta: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.expired_last = 0
+        self.expired_total = 0
+        self._migrate_legacy(stem + ".json")
 
-    def save(self):
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path,"w",encoding="utf-8") as f: 
-            json.dump(self.data,f,ensure_ascii=False,indent=2)
+    def _migrate_legacy(self, legacy_path: str):
+        if not os.path.isfile(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data = {b: {fp: int(ts) for fp, ts in mp.items()} for b, mp in data.items()}
+        except Exception as e:
+            # Set it aside rather than overwrite it, so it can be repaired and migrated by hand.
+            os.replace(legacy_path, legacy_path + ".corrupt")
+            if self.logger:
+                self.logger.warning(
+                    f"[SeenStore] could not read {legacy_path} ({e}); nothing migrated, "
+                    f"kept as {legacy_path}.corrupt"
+                )
+            return
+        self.backend.write(data)
+        os.replace(legacy_path, legacy_path + ".migrated")
+        if self.logger:
+            count = sum(len(mp) for mp in data.values())
+            self.logger.info(f"[SeenStore] migrated {count} fingerprint(s) from {legacy_path}")
 
     def purge_old(self):
-        now=int(time.time())
-        cutoff=now-self.ttl_seconds
-        changed=False
-        for bucket,mp in list(self.data.items()):
-            for fp,ts in list(mp.items()):
-                if ts<cutoff: del mp[fp]
-                changed=True
-            if not mp: 
-                del self.data[bucket]
-                changed=True
-        if changed: 
-            self.save()
+        now = int(time.time())
+        cutoff = now - self.ttl_seconds
+        with self._lock:
+            self.commit()
+            expired = self.backend.purge(cutoff)
+        self.expired_last = expired
+        self.expired_total += expired
+        SEEN_EXPIRED.inc(expired)
+        if expired and self.logger:
+            self.logger.info(f"[SeenStore] expired {expired} fingerprint(s)")
+        return expired
 
     def mark_seen(self, bucket: str, fingerprint: str):
-        now=int(time.time())
-        b=self.data.setdefault(bucket,{})
-        b[fingerprint]=now
-        self.save()
-        
+        self.mark_seen_many(bucket, [fingerprint])
+
+    def mark_seen_many(self, bucket: str, fingerprints: Iterable[str]):
+        now = int(time.time())
+        with self._lock:
+            b = self._pending.setdefault(bucket, {})
+            for fp in fingerprints:
+                b[fp] = now
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Small per-source state (e.g. a high-water mark) stored next to the fingerprints."""
+        with self._lock:
+            return self._meta.get(key, default)
+
+    def set_meta(self, key: str, value: str):
+        """Buffered like mark_seen and written by the same commit()."""
+        with self._lock:
+            self._meta[key] = str(value)
+            self._pending_meta[key] = str(value)
+
+    def commit(self):
+        with self._lock:
+            if not self._pending and not self._pending_meta:
+                return
+            pending, self._pending = self._pending, {}
+            meta, self._pending_meta = self._pending_meta, {}
+            try:
+                with SEEN_COMMIT_SECONDS.time():
+                    self.backend.write(pending, meta)
+            except Exception:
+                for bucket, mp in pending.items():
+                    self._pending.setdefault(bucket, {}).update(mp)
+                self._pending_meta = {**meta, **self._pending_meta}
+                raise
+            SEEN_WRITTEN.inc(sum(len(mp) for mp in pending.values()))
+
     def is_seen(self, bucket: str, fingerprint: str) -> bool:
-        return fingerprint in self.data.get(bucket, {})
+        with self._lock:
+            seen = fingerprint in self._pending.get(bucket, {}) or self.backend.contains(
+                bucket, fingerprint
+            )
+        SEEN_LOOKUPS.inc(bucket=bucket, result="hit" if seen else "miss")
+        return seen
+
+    def close(self):
+        with self._lock:
+            self.commit()
+            self.backend.close()
@@ -0,0 +1,34 @@
+import threading, time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupReport:
+    """Wall-clock timings of the startup phases, printed once the first polls are running
+    (`--startup-report`).  Phases may overlap when they run on different threads, so each
+    line shows when the phase started as well as how long it took."""
+
+    def __init__(self, started: float, enabled: bool = False):
+        self.started = started
+        self.enabled = enabled
+        self.phases: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start - self.started, time.perf_counter() - start))
+
+    def print(self, final: str = "first poll started"):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.started
+        width = max([len(final)] + [len(name) for name, _, _ in self.phases])
+        print("Startup report (seconds since process start):", flush=True)
+        for name, at, took in sorted(self.phases, key=lambda p: p[1]):
+            print(f"  {name:<{width}}  at {at:7.3f}  took {took:7.3f}", flush=True)
+        print(f"  {final:<{width}}  at {total:7.3f}", flush=True)
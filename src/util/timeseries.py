@@ -0,0 +1,84 @@
+import math, threading, time
+from typing import Any, Dict, Iterable, Optional
+
+AGGREGATES = ("min", "max", "mean", "sum", "last", "count", "rate")
+
+
+class RollingSeries:
+    """Fixed-capacity ring of timestamped readings with one float64 column per metric.
+
+    `append()` overwrites the oldest slot, so memory is set by `capacity` alone however
+    fast readings arrive.  Aggregates select their window with one vectorized comparison
+    on the timestamp column and ignore missing values (NaN).  `rate` is the least-squares
+    slope over the window, per hour, once the readings span a tenth of the window.  Safe
+    to append from the receiver threads while the poller aggregates.
+    """
+
+    def __init__(self, metrics: Iterable[str], capacity: int = 8192):
+        import numpy as np
+
+        self._np = np
+        self.capacity = max(2, int(capacity))
+        self.metrics = list(metrics)
+        self._ts = np.full(self.capacity, np.nan)
+        self._cols = {m: np.full(self.capacity, np.nan) for m in self.metrics}
+        self._next = 0
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts: float, values: Dict[str, Optional[float]]) -> None:
+        with self._lock:
+            i = self._next
+            self._ts[i] = ts
+            for m, col in self._cols.items():
+                v = values.get(m)
+                col[i] = math.nan if v is None else v
+            self._next = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def aggregate(
+        self, metric: str, how: str, window_seconds: float, now: Optional[float] = None
+    ) -> Optional[float]:
+        """`how` over the readings of the last `window_seconds`; None when there are none."""
+        np = self._np
+        now = time.time() if now is None else now
+        with self._lock:
+            mask = self._ts >= now - window_seconds
+            values = self._cols[metric][mask]
+            ts = self._ts[mask]
+        present = ~np.isnan(values)
+        if not present.any():
+            return None
+        values, ts = values[present], ts[present]
+        if how == "count":
+            return float(values.size)
+        if how == "last":
+            return float(values[np.argmax(ts)])
+        if how == "rate":
+            # a slope over a few seconds of readings is noise, not a trend
+            if values.size < 2 or ts.max() - ts.min() < window_seconds * 0.1:
+                return None
+            dt = ts - ts.mean()
+            denom = float((dt * dt).sum())
+            if denom == 0.0:
+                return None
+            return float((dt * (values - values.mean())).sum() / denom * 3600.0)
+        if how not in ("min", "max", "mean", "sum"):
+            raise ValueError(f"unknown aggregate {how!r}; expected one of {AGGREGATES}")
+        return float(getattr(values, how)())
+
+    def aggregates(
+        self, specs: Dict[str, Dict[str, Any]], now: Optional[float] = None
+    ) -> Dict[str, float]:
+        """{field: value} for specs like {"peak_gust_10m": {"metric": "wind_gust_mph",
+        "agg": "max", "window_minutes": 10}}, rounded to 2 places; empty windows are left
+        out."""
+        now = time.time() if now is None else now
+        out = {}
+        for field, spec in specs.items():
+            value = self.aggregate(
+                spec["metric"], spec.get("agg", "mean"), float(spec["window_minutes"]) * 60, now
+            )
+            if value is not None:
+                out[field] = round(value, 2)
+        return out
@@ -1,29 +1,141 @@
 # ws5000_capture.py
 from typing import Callable, Optional, Dict, Any
-import sys
-from scapy.all import sniff, UDP, Raw, IP  # requires sudo on macOS for pcap
+import socket, sys, threading
+
+
+class WS5000SocketListener:
+    """Plain UDP socket listener for WS-5000 broadcasts; no root or pcap needed.
+
+    The socket is bound to `dest_port` with SO_REUSEADDR (so other listeners on the host
+    can share the port) and SO_BROADCAST.  Each wake-up drains up to `batch_size`
+    datagrams with recvfrom_into() into slots of one preallocated buffer, then hands them
+    to `callback(payload, meta)` (the same interface as WS5000BroadcastCapture).  Per-packet
+    logging only with `debug`.
+    """
+
+    def __init__(
+        self,
+        dest_port: int = 59387,
+        host: str = "",
+        callback: Optional[Callable[[bytes, Dict[str, Any]], None]] = None,
+        debug: bool = False,
+        batch_size: int = 32,
+        max_datagram: int = 2048,
+        logger=None,
+    ) -> None:
+        self.dest_port = dest_port
+        self.host = host
+        self.callback = callback
+        self.debug = debug
+        self.batch_size = max(1, int(batch_size))
+        self.max_datagram = int(max_datagram)
+        self.logger = logger
+        self._buf = bytearray(self.batch_size * self.max_datagram)
+        self._stop = threading.Event()
+        self.sock: Optional[socket.socket] = None
+
+    def _open(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind((self.host, self.dest_port))
+        sock.settimeout(0.5)  # so stop() is noticed
+        return sock
+
+    def _log(self, level: str, text: str) -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(f"[ws5000_capture] {text}")
+
+    def run_blocking(self) -> None:
+        try:
+            self.sock = self._open()
+        except OSError as e:
+            self._log("error", f"cannot bind UDP {self.host or '*'}:{self.dest_port}: {e}")
+            return
+        self._log("debug", f"listening on UDP {self.host or '*'}:{self.dest_port}")
+        view = memoryview(self._buf)
+        size = self.max_datagram
+        slots = [view[i * size : (i + 1) * size] for i in range(self.batch_size)]
+        received = []
+        try:
+            while not self._stop.is_set():
+                try:
+                    n, addr = self.sock.recvfrom_into(slots[0])
+                except socket.timeout:
+                    continue
+                received.append((n, addr))
+                # Whatever else is already queued comes out without waiting.
+                self.sock.setblocking(False)
+                try:
+                    while len(received) < self.batch_size:
+                        received.append(self.sock.recvfrom_into(slots[len(received)]))
+                except (BlockingIOError, InterruptedError):
+                    pass
+                finally:
+                    self.sock.settimeout(0.5)
+                for slot, (n, addr) in zip(slots, received):
+                    self._deliver(bytes(slot[:n]), addr)
+                received.clear()
+        except OSError as e:
+            if not self._stop.is_set():
+                self._log("error", f"receive failed: {e}")
+        finally:
+            self.sock.close()
+
+    def _deliver(self, payload: bytes, addr) -> None:
+        meta = {
+            "src_ip": addr[0],
+            "src_port": addr[1],
+            "dst_ip": self.host or "0.0.0.0",
+            "dst_port": self.dest_port,
+        }
+        if self.debug:
+            self._log(
+                "debug",
+                f"pkt {meta['src_ip']}:{meta['src_port']} -> :{self.dest_port} "
+                f"payload={len(payload)}B",
+            )
+        if self.callback:
+            try:
+                self.callback(payload, meta)
+            except Exception as e:
+                self._log("error", f"callback error: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
 
 
 class WS5000BroadcastCapture:
-    """Scapy/pcap blocking capture of WS-5000 UDP broadcasts."""
+    """Scapy/pcap blocking capture of WS-5000 UDP broadcasts (needs root, or sudo on macOS).
+    Only used when `capture` is "scapy"; scapy is imported on first use."""
 
     def __init__(
         self,
         dest_port: int = 59387,
         iface: Optional[str] = None,
         callback: Optional[Callable[[bytes, Dict[str, Any]], None]] = None,
-        debug: bool = True,
+        debug: bool = False,
     ) -> None:
         self.dest_ip = "255.255.255.255"
         self.dest_port = dest_port
         self.iface = iface
         self.callback = callback
         self.debug = debug
-        self.bpf = f"udp and dst host {self.dest_ip}"  # port filtered in _on_packet
+        self.bpf = f"udp and dst host {self.dest_ip} and dst port {self.dest_port}"
 
     def run_blocking(self) -> None:
+        try:
+            from scapy.all import sniff, UDP, Raw, IP
+        except ImportError as e:
+            print(
+                f"[ws5000_capture] capture 'scapy' needs scapy installed: {e}",
+                file=sys.stderr,
+                flush=True,
+            )
+            return
+        self._layers = (UDP, Raw, IP)
         print(
-            f"[ws5000_capture] sniff start iface={self.iface or '(auto)'} BPF='{self.bpf}' filter_dport={self.dest_port}",
+            f"[ws5000_capture] sniff start iface={self.iface or '(auto)'} BPF='{self.bpf}'",
             file=sys.stderr,
             flush=True,
         )
@@ -37,6 +149,7 @@ class WS5000BroadcastCapture:
             )
 
     def _on_packet(self, pkt) -> None:
+        UDP, Raw, IP = self._layers
         if not (IP in pkt and UDP in pkt):
             return
         ip = pkt[IP]
@@ -7,6 +7,43 @@ import pytz
 
 _QS_RUN_RE = re.compile(r"([A-Za-z0-9_]+=[^&\s]+(?:[&;,\s]+[A-Za-z0-9_]+=[^&\s]+)+)")
 _PAIR_RE = re.compile(r"([A-Za-z0-9_]+)\s*=\s*([^&;,\s]+)")
+# A whole well-formed query string: key=value pairs joined by "&", nothing else.  One C
+# pass over the bytes validates it, after which splitting on "&" and "=" is safe.
+_FAST_PAIR = rb"[A-Za-z0-9_]+=[A-Za-z0-9_.:%+\-]*"
+_FAST_QS_RE = re.compile(_FAST_PAIR + rb"(?:&" + _FAST_PAIR + rb")*")
+_TRAILING_WS = b" \t\r\n\0"
+
+# Keys of WS5000Decoder.measurements(), i.e. the metrics a reading contributes to a series
+MEASUREMENTS = (
+    "temperature_F",
+    "humidity_pct",
+    "wind_mph",
+    "wind_gust_mph",
+    "pressure_in_hg",
+    "rain_rate_in_hr",
+    "rain_daily_in",
+    "solar_wm2",
+    "uv_index",
+)
+
+COMPASS_POINTS = (
+    "N",
+    "NNE",
+    "NE",
+    "ENE",
+    "E",
+    "ESE",
+    "SE",
+    "SSE",
+    "S",
+    "SSW",
+    "SW",
+    "WSW",
+    "W",
+    "WNW",
+    "NW",
+    "NNW",
+)
 
 
 class WS5000Decoder:
@@ -47,7 +84,37 @@ class WS5000Decoder:
             return first.strip()
         return ""
 
+    def _fast_fields(self, raw: bytes) -> Optional[Dict[str, str]]:
+        """Fields of a well-formed Ambient query string (`k=v&k=v...`, optionally after
+        `path?`), or None for anything else so the robust parser takes over.  Validation runs
+        on the bytes in place, without the robust path's decode and ASCII-filter copies."""
+        if not isinstance(raw, (bytes, bytearray)):
+            return None
+        end = len(raw)
+        while end and raw[end - 1] in _TRAILING_WS:
+            end -= 1
+        pos = raw.find(b"?", 0, end) + 1
+        if pos >= end:
+            return None
+        if _FAST_QS_RE.fullmatch(raw, pos, end) is None:
+            return None
+        fields: Dict[str, str] = {}
+        for pair in raw[pos:end].decode("ascii").split("&"):
+            key, _, value = pair.partition("=")
+            if "%" in value or "+" in value:
+                value = unquote_plus(value)
+                if "%" in value or "+" in value:
+                    return None  # the robust path unquotes twice; let it
+            fields[key] = value
+        return fields
+
     def parse_fields(self, raw: bytes) -> Dict[str, str]:
+        fields = self._fast_fields(raw)
+        if fields is not None:
+            return fields
+        return self._parse_fields_robust(raw)
+
+    def _parse_fields_robust(self, raw: bytes) -> Dict[str, str]:
         text = self._safe_text(raw)
         ascii_text = self._ascii_only(text)
         candidate = self._extract_candidate(ascii_text)
@@ -75,35 +142,66 @@ class WS5000Decoder:
         return self._normalize(fields)
 
     # -------- normalization helpers --------
+    # float() already ignores surrounding whitespace and rejects "", "NA", "null" and
+    # "None"; only NaN needs catching.
     @staticmethod
     def _to_float(v: Optional[str]) -> Optional[float]:
-        if v is None:
-            return None
         try:
-            s = v.strip()
-            if s in ("", "NA", "NAN", "nan", "null", "None"):
-                return None
-            return float(s)
-        except Exception:
+            f = float(v)
+        except (TypeError, ValueError):
             return None
+        return None if f != f else f
 
     @staticmethod
     def _to_int(v: Optional[str]) -> Optional[int]:
-        if v is None:
-            return None
         try:
-            s = v.strip()
-            if s in ("", "NA", "NAN", "nan", "null", "None"):
-                return None
-            return int(float(s))
-        except Exception:
+            return int(float(v))
+        except (TypeError, ValueError, OverflowError):
             return None
 
+    # field -> converter for every numeric field _normalize reads
+    NUMERIC_FIELDS = {
+        **dict.fromkeys(
+            (
+                "tempf",
+                "tempc",
+                "indoortempf",
+                "tempinf",
+                "indoortempc",
+                "tempinc",
+                "windspeedmph",
+                "windgustmph",
+                "baromin",
+                "baromrelin",
+                "baromabsin",
+                "rainratein",
+                "dailyrainin",
+                "eventrainin",
+                "solarradiation",
+                "UV",
+                "uv",
+                "pm2_5",
+                "pm25",
+                "pm25_ch1",
+                "pm10",
+                "pm10_ch1",
+            ),
+            _to_float,
+        ),
+        **dict.fromkeys(("humidity", "indoorhumidity", "humidityin", "winddir"), _to_int),
+    }
+
     @staticmethod
     def _parse_dateutc(s: Optional[str]):
         if not s:
             return None
         s = s.strip()
+        if len(s) == 19 and s[10] == " ":
+            # the console's own "%Y-%m-%d %H:%M:%S", several times faster than strptime
+            try:
+                return datetime.fromisoformat(s).replace(tzinfo=timezone.utc)
+            except ValueError:
+                pass
         for fmt in (
             "%Y-%m-%d %H:%M:%S",
             "%Y-%m-%dT%H:%M:%SZ",
@@ -124,24 +222,6 @@ class WS5000Decoder:
         Converts wind direction in degrees (0-360) to a 16-point compass direction.
         N is 0 degrees, E is 90 degrees, S is 180 degrees, W is 270 degrees.
         """
-        directions = [
-            "N",
-            "NNE",
-            "NE",
-            "ENE",
-            "E",
-            "ESE",
-            "SE",
-            "SSE",
-            "S",
-            "SSW",
-            "SW",
-            "WSW",
-            "W",
-            "WNW",
-            "NW",
-            "NNW",
-        ]
         # Adjust degrees to start N at the center of its range (348.75 to 11.25)
         # This shifts the degree range so N is centered around 0.
         adjusted_degrees = (degrees + 11.25) % 360
@@ -150,65 +230,88 @@ class WS5000Decoder:
         # Each direction covers 22.5 degrees (360 / 16)
         index = int(adjusted_degrees / 22.5)
 
-        return directions[index]
+        return COMPASS_POINTS[index]
 
     # -------- normalization --------
+    def _numbers(self, fields: Dict[str, str]) -> Dict[str, Any]:
+        """Every numeric field present, converted once through NUMERIC_FIELDS."""
+        table = self.NUMERIC_FIELDS
+        return {k: table[k](v) for k, v in fields.items() if k in table}
+
+    def measurements(self, fields: Dict[str, str]) -> Dict[str, Optional[float]]:
+        """The numeric readings behind the posted record, unformatted (for the time
+        series); missing readings are None."""
+        num = self._numbers(fields)
+        pressure = next(
+            (num[k] for k in ("baromin", "baromrelin", "baromabsin") if num.get(k) is not None),
+            None,
+        )
+        uv = next((num.get(k) for k in ("UV", "uv") if fields.get(k)), None)
+        return {
+            "temperature_F": num.get("tempf"),
+            "humidity_pct": num.get("humidity"),
+            "wind_mph": num.get("windspeedmph"),
+            "wind_gust_mph": num.get("windgustmph"),
+            "pressure_in_hg": pressure,
+            "rain_rate_in_hr": num.get("rainratein"),
+            "rain_daily_in": num.get("dailyrainin") or num.get("eventrainin"),
+            "solar_wm2": num.get("solarradiation"),
+            "uv_index": uv,
+        }
+
     def _normalize(self, fields: Dict[str, str]) -> Dict[str, Any]:
-        f = self._to_float(fields.get("tempf"))
-        c = self._to_float(fields.get("tempc"))
+        num = self._numbers(fields)
+
+        def first(*keys):
+            # the first alias with a non-empty value wins, even if it doesn't convert
+            for k in keys:
+                if fields.get(k):
+                    return num.get(k)
+            return None
+
+        f = num.get("tempf")
+        c = num.get("tempc")
         temp_c = c if c is not None else (None if f is None else (f - 32) * 5 / 9)
         temp_f = f if f is not None else None
 
         # Indoor temp aliases: Ambient uses 'tempinf' for indoor F
-        f = self._to_float(fields.get("indoortempf") or fields.get("tempinf"))
-        c = self._to_float(fields.get("indoortempc") or fields.get("tempinc"))
+        f = first("indoortempf", "tempinf")
+        c = first("indoortempc", "tempinc")
         indoor_c = c if c is not None else (None if f is None else (f - 32) * 5 / 9)
 
-        humidity = self._to_int(fields.get("humidity"))
+        humidity = num.get("humidity")
         # Indoor humidity alias: Ambient uses 'humidityin'
-        indoor_h = self._to_int(
-            fields.get("indoorhumidity") or fields.get("humidityin")
-        )
+        indoor_h = first("indoorhumidity", "humidityin")
 
-        mph = self._to_float(fields.get("windspeedmph"))
+        mph = num.get("windspeedmph")
         wind_mps = mph * 0.44704 if mph is not None else None
         wind_mph = mph if mph is not None else None
-        mph_g = self._to_float(fields.get("windgustmph"))
+        mph_g = num.get("windgustmph")
         wind_gust_mps = mph_g * 0.44704 if mph_g is not None else None
         wind_gust_mph = mph_g if mph_g is not None else None
-        wind_dir = self._to_int(fields.get("winddir"))
-        if wind_dir is None:
-            wind_dir = None
+        wind_dir = num.get("winddir")
 
         pressure_hpa = None
         for k in ("baromin", "baromrelin", "baromabsin"):
-            v = self._to_float(fields.get(k))
+            v = num.get(k)
             if v is not None:
                 pressure_hpa = v * 33.8638866667
                 break
 
         pressure_in_hg = pressure_hpa * 0.02952998 if pressure_hpa is not None else None
 
-        rr_in = self._to_float(fields.get("rainratein"))
+        rr_in = num.get("rainratein")
         rain_rate_in_hr = rr_in if rr_in is not None else 0
         rain_rate_mm_h = rr_in * 25.4 if rr_in is not None else None
-        dr_in = self._to_float(fields.get("dailyrainin")) or self._to_float(
-            fields.get("eventrainin")
-        )
+        dr_in = num.get("dailyrainin") or num.get("eventrainin")
         rain_daily_mm = dr_in * 25.4 if dr_in is not None else 0
         rain_daily_in = dr_in if dr_in is not None else 0
 
-        solar_wm2 = self._to_float(fields.get("solarradiation"))
-        uv_index = self._to_float(fields.get("UV") or fields.get("uv"))
+        solar_wm2 = num.get("solarradiation")
+        uv_index = first("UV", "uv")
 
-        pm25 = (
-            self._to_float(fields.get("pm2_5"))
-            or self._to_float(fields.get("pm25"))
-            or self._to_float(fields.get("pm25_ch1"))
-        )
-        pm10 = self._to_float(fields.get("pm10")) or self._to_float(
-            fields.get("pm10_ch1")
-        )
+        pm25 = num.get("pm2_5") or num.get("pm25") or num.get("pm25_ch1")
+        pm10 = num.get("pm10") or num.get("pm10_ch1")
 
         dt_utc = datetime.now(timezone.utc)
         for k in ("dateutc", "datetime", "time_utc"):
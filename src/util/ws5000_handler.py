@@ -1,16 +1,68 @@
 # ws5000_handler.py (v2, package-style)
-from typing import Dict, Any, Optional
-import threading, queue, time, sys
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import threading, time
+from util.metrics import registry
+
+WS5000_RECEIVED = registry.counter(
+    "newsfeeds_ws5000_messages_total", "Messages received from the station", ["type"]
+)
+WS5000_DROPPED = registry.counter(
+    "newsfeeds_ws5000_dropped_total", "Messages evicted from the full buffer unread", ["type"]
+)
 
 
 class Handler:
-    def __init__(self, cfg: Dict[str, Any], logger):
+    """Receives WS-5000 pushes on a background thread.
+
+    Messages go into a ring buffer of `buffer_size` entries (params, default 64); when it
+    is full the oldest unread message is evicted and counted in `dropped`.  The newest
+    message is also kept in its own slot, so `latest()` is O(1) however many arrived since
+    the last poll.  `on_message`, if given, is called with every message as it arrives, on
+    the receiving thread.
+    """
+
+    def __init__(
+        self,
+        cfg: Dict[str, Any],
+        logger,
+        on_message: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
         self.cfg = cfg or {}
         self.mode = str(self.cfg.get("mode", "http")).lower()
-        self._q: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        params = self.cfg.get("params", {}) if isinstance(self.cfg, dict) else {}
+        size = max(1, int(params.get("buffer_size", 64)))
+        self._buf: "deque[Dict[str, Any]]" = deque(maxlen=size)
+        self._latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self.received = 0
+        self.dropped = 0
+        self._taken = 0
         self._thread: Optional[threading.Thread] = None
         self._stop = threading.Event()
         self.logger = logger
+        self.on_message = on_message
+
+    def _section(self, name: str) -> Dict[str, Any]:
+        """The `http`/`udp` settings, from params (as in config-example.json) or top level."""
+        if not isinstance(self.cfg, dict):
+            return {}
+        return self.cfg.get(name) or self.cfg.get("params", {}).get(name) or {}
+
+    def _put(self, msg: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._buf) == self._buf.maxlen:
+                self.dropped += 1
+                WS5000_DROPPED.inc(type=msg["type"])
+            self._buf.append(msg)
+            self._latest = msg
+            self.received += 1
+        WS5000_RECEIVED.inc(type=msg["type"])
+        if self.on_message is not None:
+            try:
+                self.on_message(msg)
+            except Exception as e:
+                self.logger.error(f"[ws5000_handler] on_message failed: {e}")
 
     def start(self) -> None:
         if self.mode == "udp":
@@ -23,17 +75,37 @@ class Handler:
             )
         self._thread.start()
 
-    def poll(self):
-        try:
-            return self._q.get_nowait()
-        except queue.Empty:
-            return None
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """Oldest unread message, or None.  Everything no longer in the buffer counts as
+        taken, so a later latest() only reports what poll() has not handed out."""
+        with self._lock:
+            msg = self._buf.popleft() if self._buf else None
+            self._taken = self.received - len(self._buf)
+            return msg
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Every unread message still in the buffer, oldest first."""
+        with self._lock:
+            out = list(self._buf)
+            self._buf.clear()
+            self._taken = self.received
+        return out
+
+    def latest(self) -> Tuple[Optional[Dict[str, Any]], int]:
+        """(newest message, how many arrived since the last latest() or drain()), or
+        (None, 0) when nothing new came in.  Older unread messages are superseded and
+        cleared from the buffer."""
+        with self._lock:
+            fresh = self.received - self._taken
+            self._taken = self.received
+            self._buf.clear()
+            return (self._latest if fresh else None), fresh
 
     def _http_loop(self) -> None:
-        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
         from urllib.parse import urlsplit, parse_qs, unquote_plus
 
-        http_cfg = self.cfg.get("http", {}) if isinstance(self.cfg, dict) else {}
+        http_cfg = self._section("http")
         host = str(http_cfg.get("host", "0.0.0.0"))
         port = int(http_cfg.get("port", 46000))
         verbose = bool(http_cfg.get("verbose", False))
@@ -71,18 +143,19 @@ class Handler:
                 return fields
 
             def _enqueue(self, method: str):
+                # The query string carries the fields (and the station's passkey); keep only
+                # the path.
                 msg = {
                     "type": "http",
                     "fields": self._fields(),
                     "transport": {
                         "src": self.client_address[0],
-                        "path": self.path,
+                        "path": self.path.split("?", 1)[0],
                         "method": method,
-                        "headers": dict(self.headers),
                         "ts": time.time(),
                     },
                 }
-                outer._q.put(msg)
+                outer._put(msg)
 
             def do_GET(self):
                 self._enqueue("GET")
@@ -100,18 +173,17 @@ class Handler:
                 if verbose:
                     super().log_message(fmt, *args)
 
-        server = HTTPServer((host, port), RequestHandler)
         try:
-            self.logger.debug(
-                f"[ws5000_handler:http] Listening on {host}:{port}",
-                file=sys.stderr,
-                flush=True,
-            )
+            server = ThreadingHTTPServer((host, port), RequestHandler)
+        except OSError as e:
+            self.logger.error(f"[ws5000_handler:http] cannot listen on {host}:{port}: {e}")
+            return
+        server.daemon_threads = True
+        try:
+            self.logger.debug(f"[ws5000_handler:http] Listening on {host}:{port}")
             server.serve_forever(poll_interval=0.5)
         except Exception as e:
-            self.logger.debug(
-                f"[ws5000_handler:http] server error: {e}", file=sys.stderr, flush=True
-            )
+            self.logger.error(f"[ws5000_handler:http] server error: {e}")
         finally:
             try:
                 server.server_close()
@@ -119,28 +191,28 @@ class Handler:
                 pass
 
     def _udp_loop(self) -> None:
-        from .ws5000_capture import WS5000BroadcastCapture
+        from .ws5000_capture import WS5000BroadcastCapture, WS5000SocketListener
 
-        udp_cfg = self.cfg.get("udp", {}) if isinstance(self.cfg, dict) else {}
+        udp_cfg = self._section("udp")
         iface = udp_cfg.get("iface") or None
         port = int(udp_cfg.get("port", 59387))
+        debug = bool(udp_cfg.get("debug", False))
 
         def on_packet(payload: bytes, meta: Dict[str, Any]) -> None:
-            self._q.put(
-                {
-                    "type": "udp",
-                    "payload": payload,
-                    "transport": meta,
-                    "ts": time.time(),
-                }
-            )
+            self._put({"type": "udp", "payload": payload, "transport": meta, "ts": time.time()})
 
-        self.logger.debug(
-            f"[ws5000_handler:udp] Capture iface={iface or '(auto)'} port={port}",
-            file=sys.stderr,
-            flush=True,
-        )
-        cap = WS5000BroadcastCapture(
-            dest_port=port, iface=iface, callback=on_packet, debug=True
-        )
+        if str(udp_cfg.get("capture", "socket")).lower() == "scapy":
+            self.logger.debug(f"[ws5000_handler:udp] Capture iface={iface or '(auto)'} port={port}")
+            cap = WS5000BroadcastCapture(
+                dest_port=port, iface=iface, callback=on_packet, debug=debug
+            )
+        else:
+            cap = WS5000SocketListener(
+                dest_port=port,
+                host=str(udp_cfg.get("host", "")),
+                callback=on_packet,
+                debug=debug,
+                batch_size=int(udp_cfg.get("batch_size", 32)),
+                logger=self.logger,
+            )
         cap.run_blocking()
@@ -0,0 +1,53 @@
+import math, random
+
+import pytest
+
+from sources.geo import KM_PER_MI, GeoFilter, bounding_box, haversine_mi, km_between
+
+
+def test_haversine_matches_the_scalar_distance():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(1)
+    lats = np.array([rng.uniform(32, 42) for _ in range(200)])
+    lons = np.array([rng.uniform(-124, -114) for _ in range(200)])
+    miles = haversine_mi(37.44, -122.14, lats, lons)
+    for lat, lon, mi in zip(lats, lons, miles):
+        assert mi == pytest.approx(km_between(37.44, -122.14, lat, lon) / KM_PER_MI)
+
+
+@pytest.mark.parametrize("lat0", [0.0, 37.44, 64.8, -54.8])
+def test_bounding_box_contains_the_whole_circle(lat0):
+    max_mi = 100.0
+    lat_min, lat_max, lon_min, lon_max = bounding_box(lat0, 10.0, max_mi)
+    for step in range(360):
+        bearing = math.radians(step)
+        lat, lon = destination(lat0, 10.0, bearing, max_mi)
+        assert lat_min <= lat <= lat_max
+        assert lon_min <= lon <= lon_max
+
+
+def test_bounding_box_over_a_pole_spans_every_longitude():
+    assert bounding_box(89.5, 0.0, 100.0)[2:] == (-180.0, 180.0)
+
+
+def test_geo_filter_keeps_points_within_range_in_order():
+    pytest.importorskip("numpy")
+    geo = GeoFilter(37.44, -122.14, 10.0)
+    lats = [37.44, 40.0, 37.50, 37.44 + 10.0 / 69.0 * 1.01]
+    lons = [-122.14, -122.14, -122.14, -122.14]
+    kept = geo.within(lats, lons)
+    assert [i for i, _ in kept] == [0, 2]
+    assert kept[1][1] == pytest.approx(km_between(37.44, -122.14, 37.50, -122.14) / KM_PER_MI)
+    assert geo.within(lats, lons) == kept  # served from the memo
+    assert geo.within([], []) == []
+
+
+def destination(lat0, lon0, bearing, miles):
+    """The point `miles` from (lat0, lon0) along `bearing` on the haversine sphere."""
+    d = miles * KM_PER_MI / 6371.0088
+    p0, l0 = math.radians(lat0), math.radians(lon0)
+    p = math.asin(math.sin(p0) * math.cos(d) + math.cos(p0) * math.sin(d) * math.cos(bearing))
+    l = l0 + math.atan2(
+        math.sin(bearing) * math.sin(d) * math.cos(p0), math.cos(d) - math.sin(p0) * math.sin(p)
+    )
+    return math.degrees(p), math.degrees(l)
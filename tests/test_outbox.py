@@ -0,0 +1,125 @@
+import logging, time
+
+import pytest
+import requests
+from mattermostdriver.exceptions import InvalidOrMissingParameters, ResourceNotFound
+
+from util.outbox import Outbox, http_status, permanent
+
+log = logging.getLogger("tests")
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(
+        str(tmp_path / "outbox.db"),
+        log,
+        {"workers": 1, "base_backoff_seconds": 2, "max_backoff_seconds": 60},
+    )
+    yield box
+    box.close(flush_timeout=0)
+
+
+def row(box, msg_id):
+    return box.conn.execute(
+        "SELECT attempts, next_attempt, dead, last_error, body FROM outbox WHERE id=?",
+        (msg_id,),
+    ).fetchone()
+
+
+@pytest.mark.parametrize(
+    "err, expected",
+    [
+        (http_error(400), True),
+        (http_error(404), True),
+        (http_error(408), False),
+        (http_error(429), False),
+        (http_error(500), False),
+        (ResourceNotFound("gone"), True),
+        (requests.ConnectionError("refused"), False),
+        (RuntimeError("no status"), False),
+    ],
+)
+def test_permanent(err, expected):
+    assert permanent(err) is expected
+
+
+def test_status_is_found_through_the_cause():
+    try:
+        try:
+            raise http_error(413)
+        except requests.HTTPError as e:
+            raise RuntimeError("POST failed") from e
+    except RuntimeError as e:
+        assert http_status(e) == 413
+
+
+def test_transient_failures_back_off_up_to_the_cap(outbox):
+    msg_id = outbox.enqueue("mattermost", "chan", {"message": "hi"})
+    delays = []
+    for attempts in range(1, 12):
+        before = time.time()
+        outbox._failed(msg_id, attempts, requests.ConnectionError("down"), {"message": "hi"})
+        delays.append(row(outbox, msg_id)[1] - before)
+    assert 2 * 0.8 <= delays[0] <= 2 * 1.2 + 0.1
+    assert 8 * 0.8 <= delays[2] <= 8 * 1.2 + 0.1
+    assert all(d <= 60 * 1.2 + 0.1 for d in delays)
+    assert delays[-1] >= 60 * 0.8
+    assert row(outbox, msg_id)[2] == 0
+    assert outbox.pending() == 1 and outbox.dead() == 0
+
+
+def test_permanent_failure_marks_the_row_dead(outbox):
+    msg_id = outbox.enqueue("mattermost", "chan", {"message": "hi"})
+    outbox._failed(msg_id, 1, InvalidOrMissingParameters("bad"), {"message": "hi"})
+    attempts, _, dead, last_error, _ = row(outbox, msg_id)
+    assert (attempts, dead, last_error) == (1, 1, "bad")
+    assert outbox.pending() == 0 and outbox.dead() == 1
+
+
+def test_purge_dead_keeps_recent_rows(outbox):
+    old = outbox.enqueue("mattermost", "chan", {})
+    recent = outbox.enqueue("mattermost", "chan", {})
+    for msg_id in (old, recent):
+        outbox._failed(msg_id, 1, http_error(403), {})
+    outbox.conn.execute("UPDATE outbox SET next_attempt=0 WHERE id=?", (old,))
+    assert outbox.purge_dead() == 1
+    assert row(outbox, old) is None and row(outbox, recent) is not None
+
+
+def test_failed_body_is_saved_for_the_retry(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), log, {"base_backoff_seconds": 0.01})
+    bodies = []
+
+    def send(body):
+        bodies.append(dict(body))
+        if len(bodies) == 1:
+            body["_replies_sent"] = 1
+            raise requests.ConnectionError("down")
+
+    box.register("mattermost", send)
+    box.start()
+    box.enqueue("mattermost", "chan", {"message": "hi"})
+    deadline = time.time() + 5
+    while box.delivered == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    box.close(flush_timeout=0)
+    assert box.delivered == 1
+    assert bodies == [{"message": "hi"}, {"message": "hi", "_replies_sent": 1}]
+
+
+def test_held_items_survive_a_reopen(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), log)
+    first = box.hold("digest", {"n": 1})
+    box.hold("digest", {"n": 2})
+    box.release([first])
+    box.close(flush_timeout=0)
+    box = Outbox(str(tmp_path / "outbox.db"), log)
+    assert [(key, body) for _, key, body, _ in box.held()] == [("digest", {"n": 2})]
+    box.close(flush_timeout=0)
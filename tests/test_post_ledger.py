@@ -0,0 +1,69 @@
+import sqlite3, time
+
+import pytest
+
+from util.post_ledger import PostLedger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = PostLedger(str(tmp_path / "ledger.db"), ttl_days=1)
+    yield ledger
+    ledger.close()
+
+
+def test_find_returns_the_first_identity_with_a_post(ledger):
+    ledger.record("chan", ["nws|b"], "post-b", 5)
+    assert ledger.find("chan", ["nws|a", "nws|b"]) == ("post-b", 5)
+    assert ledger.find("chan", ["nws|a"]) is None
+    assert ledger.find("other", ["nws|b"]) is None
+
+
+def test_newer_version_replaces_the_post(ledger):
+    ledger.record("chan", ["id"], "post-1", 1)
+    ledger.record("chan", ["id"], "post-2", 2)
+    assert ledger.find("chan", ["id"]) == ("post-2", 2)
+    ledger.record("chan", ["id"], "post-3", 2)
+    assert ledger.find("chan", ["id"]) == ("post-3", 2)
+
+
+def test_older_version_does_not_roll_back(ledger):
+    ledger.record("chan", ["id"], "post-2", 2)
+    ledger.record("chan", ["id"], "post-1", 1)
+    assert ledger.find("chan", ["id"]) == ("post-2", 2)
+
+
+def test_supersedes_point_every_identity_at_one_post(ledger):
+    ledger.record("chan", ["alert-1"], "post-1", 1)
+    ledger.record("chan", ["alert-2", "alert-1"], "post-1", 2)
+    assert ledger.find("chan", ["alert-2"]) == ("post-1", 2)
+    ledger.forget("post-1")
+    assert ledger.count() == 0
+
+
+def test_purge_old(ledger):
+    ledger.record("chan", ["old"], "post-1")
+    ledger.record("chan", ["new"], "post-2")
+    ledger.conn.execute(
+        "UPDATE posts SET updated=? WHERE identity='old'", (time.time() - 2 * 86400,)
+    )
+    assert ledger.purge_old() == 1
+    assert ledger.find("chan", ["old", "new"]) == ("post-2", 0)
+
+
+def test_ledger_without_versions_is_upgraded(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE posts (channel_id TEXT NOT NULL, identity TEXT NOT NULL,"
+        " post_id TEXT NOT NULL, updated REAL NOT NULL,"
+        " PRIMARY KEY (channel_id, identity)) WITHOUT ROWID"
+    )
+    conn.execute("INSERT INTO posts VALUES ('chan', 'id', 'post-1', ?)", (time.time(),))
+    conn.commit()
+    conn.close()
+    ledger = PostLedger(path)
+    assert ledger.find("chan", ["id"]) == ("post-1", 0)
+    ledger.record("chan", ["id"], "post-2", 1)
+    assert ledger.find("chan", ["id"]) == ("post-2", 1)
+    ledger.close()
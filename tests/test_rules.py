@@ -0,0 +1,97 @@
+import pytest
+
+from util.rules import Rule, RuleSet, describe
+
+
+def states(rule, readings):
+    out = []
+    for ts, value in readings:
+        event = rule.evaluate({"wind_mph": value}, ts)
+        out.append(event and event["state"])
+    return out
+
+
+def test_above_fires_once_and_clears_with_hysteresis():
+    rule = Rule(
+        {"name": "wind", "field": "wind_mph", "threshold": 20, "clear_at": 15, "notify_clear": True}
+    )
+    readings = [(0, 10), (60, 25), (120, 30), (180, 18), (240, 22), (300, 14), (360, 21)]
+    assert states(rule, readings) == [None, "fired", None, None, None, "cleared", "fired"]
+
+
+def test_below():
+    rule = Rule({"name": "cold", "kind": "below", "field": "wind_mph", "threshold": 5})
+    assert states(rule, [(0, 6), (60, 4), (120, 3), (180, 5), (240, 2)]) == [
+        None,
+        "fired",
+        None,
+        None,
+        "fired",
+    ]
+
+
+def test_cooldown_suppresses_a_quick_refire():
+    rule = Rule({"name": "wind", "field": "wind_mph", "threshold": 20, "cooldown_minutes": 10})
+    readings = [(0, 25), (60, 10), (120, 25), (180, 10), (700, 25)]
+    assert states(rule, readings) == ["fired", None, None, None, "fired"]
+
+
+def test_drop_is_measured_from_the_window_peak():
+    rule = Rule(
+        {"name": "pressure", "kind": "drop", "field": "p", "threshold": 2, "window_minutes": 10}
+    )
+    values = [(0, 30.0), (60, 29.5), (120, 29.0), (180, 27.9)]
+    assert [rule.evaluate({"p": v}, ts) is not None for ts, v in values] == [
+        False,
+        False,
+        False,
+        True,
+    ]
+    rule = Rule(
+        {"name": "pressure", "kind": "drop", "field": "p", "threshold": 2, "window_minutes": 1}
+    )
+    # the 30.0 reading has left the window by the time the value reaches 27.9
+    assert [rule.evaluate({"p": v}, ts) is not None for ts, v in values] == [False] * 4
+
+
+def test_match_fires_for_every_matching_record():
+    rule = Rule(
+        {"name": "quake", "kind": "match", "when": {"mag": {">=": 3}, "type": {"in": ["eq"]}}}
+    )
+    assert rule.evaluate({"mag": 3.5, "type": "eq"}, 0) is not None
+    assert rule.evaluate({"mag": 4.0, "type": "eq"}, 1) is not None
+    assert rule.evaluate({"mag": 2.0, "type": "eq"}, 2) is None
+    assert rule.evaluate({"mag": "n/a", "type": "eq"}, 3) is None
+    assert rule.evaluate({"type": "eq"}, 4) is None
+
+
+def test_missing_or_non_numeric_values_are_ignored():
+    rule = Rule({"name": "wind", "field": "wind_mph", "threshold": 20})
+    assert rule.evaluate({}, 0) is None
+    assert rule.evaluate({"wind_mph": "calm"}, 0) is None
+    assert not rule.active
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"name": "x", "kind": "sideways", "field": "f"},
+        {"name": "x", "kind": "above"},
+        {"name": "x", "kind": "match"},
+    ],
+)
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        Rule(spec)
+
+
+def test_ruleset_and_describe():
+    rules = RuleSet(
+        [
+            {"name": "gust", "field": "gust", "threshold": 35, "message": "Gust over 35 mph"},
+            {"name": "hot", "field": "temp", "threshold": 100},
+        ]
+    )
+    events = rules.evaluate({"gust": 41.2, "temp": 70}, ts=0)
+    assert describe(events) == "Gust over 35 mph (41.2)"
+    assert rules.evaluate({"gust": 41.2, "temp": 70}, ts=60) == []
@@ -0,0 +1,91 @@
+import json, os, time
+
+import pytest
+
+from util.seen_store import ExpiryWheel, SeenStore
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def backend(request):
+    return request.param
+
+
+def test_marks_are_buffered_until_commit(tmp_path, backend):
+    store = SeenStore(str(tmp_path / "seen"), backend=backend)
+    store.mark_seen_many("usgs", ["a", "b"])
+    assert store.is_seen("usgs", "a")
+    assert not store.is_seen("nws", "a")
+    reopened = SeenStore(str(tmp_path / "seen"), backend=backend)
+    assert not reopened.is_seen("usgs", "a")
+    store.commit()
+    reopened = SeenStore(str(tmp_path / "seen"), backend=backend)
+    assert reopened.is_seen("usgs", "a") and reopened.is_seen("usgs", "b")
+
+
+def test_meta_is_written_with_the_commit(tmp_path, backend):
+    store = SeenStore(str(tmp_path / "seen"), backend=backend)
+    store.set_meta("usgs.hwm", 42)
+    assert store.get_meta("usgs.hwm") == "42"
+    store.close()
+    reopened = SeenStore(str(tmp_path / "seen"), backend=backend)
+    assert reopened.get_meta("usgs.hwm") == "42"
+    assert reopened.get_meta("missing", "x") == "x"
+
+
+def test_purge_drops_only_expired_fingerprints(tmp_path, backend):
+    store = SeenStore(str(tmp_path / "seen"), ttl_days=1, backend=backend)
+    now = int(time.time())
+    store.backend.write({"caltrans": {"old": now - 2 * 86400, "new": now - 3600}})
+    assert store.purge_old() == 1
+    assert not store.is_seen("caltrans", "old")
+    assert store.is_seen("caltrans", "new")
+    assert store.purge_old() == 0
+    assert store.expired_total == 1
+
+
+def test_json_purge_after_reopen_sees_unloaded_shards(tmp_path):
+    now = int(time.time())
+    SeenStore(str(tmp_path / "seen"), backend="json").backend.write(
+        {"a": {"x": now - 10 * 86400}, "b": {"y": now}}
+    )
+    store = SeenStore(str(tmp_path / "seen"), ttl_days=1, backend="json")
+    assert store.purge_old() == 1
+    assert not store.is_seen("a", "x")
+    assert store.is_seen("b", "y")
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        SeenStore(str(tmp_path / "seen"), backend="redis")
+
+
+def test_legacy_file_is_migrated_once(tmp_path, backend):
+    legacy = tmp_path / "seen.json"
+    legacy.write_text(json.dumps({"nws": {"alert-1": 1700000000}}))
+    store = SeenStore(str(legacy), backend=backend)
+    assert store.is_seen("nws", "alert-1")
+    assert not legacy.exists()
+    assert (tmp_path / "seen.json.migrated").exists()
+
+
+def test_corrupt_legacy_file_is_set_aside(tmp_path, backend):
+    legacy = tmp_path / "seen.json"
+    legacy.write_text("{not json")
+    store = SeenStore(str(legacy), backend=backend)
+    assert not store.is_seen("nws", "alert-1")
+    assert not legacy.exists()
+    assert (tmp_path / "seen.json.corrupt").read_text() == "{not json"
+    assert not os.path.exists(str(legacy) + ".migrated")
+
+
+def test_expiry_wheel_returns_slots_that_began_before_the_cutoff():
+    wheel = ExpiryWheel(slot_seconds=100)
+    wheel.add("a", "x", 50)
+    wheel.add("a", "y", 150)
+    wheel.add("b", "z", 199)
+    wheel.add("b", "w", 250)
+    assert wheel.pop_candidates(100) == [("a", "x")]
+    # the slot starting at 100 began before 160, so both of its keys come back
+    assert sorted(wheel.pop_candidates(160)) == [("a", "y"), ("b", "z")]
+    assert wheel.pop_candidates(160) == []
+    assert wheel.pop_candidates(10**6) == [("b", "w")]
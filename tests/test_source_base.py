@@ -0,0 +1,70 @@
+import logging, time
+
+import pytest
+
+from sources.base import SourceBase
+from util.seen_store import SeenStore
+
+GENERAL = {"location": {"lat": 37.44, "lon": -122.14}, "timezone": "America/Los_Angeles"}
+
+
+class StubNotifier:
+    base = None
+
+
+def source(tmp_path, **cfg):
+    seen = SeenStore(str(tmp_path / "seen"))
+    cfg.setdefault("poll_seconds", 60)
+    return SourceBase("test", GENERAL, cfg, seen, logging.getLogger("tests"), StubNotifier())
+
+
+def interval(src, new_count):
+    src.schedule_next(new_count)
+    return src.next_due - time.time()
+
+
+def test_poll_range_defaults_around_poll_seconds(tmp_path):
+    src = source(tmp_path, poll_seconds=120)
+    assert (src.min_poll_seconds, src.max_poll_seconds) == (60, 480)
+    src = source(tmp_path, poll_seconds=30)
+    assert (src.min_poll_seconds, src.max_poll_seconds) == (30, 120)
+
+
+def test_idle_polls_back_off_and_news_snaps_back(tmp_path):
+    src = source(tmp_path, min_poll_seconds=60, max_poll_seconds=600, poll_jitter=0)
+    assert interval(src, 0) == pytest.approx(120, abs=1)
+    assert interval(src, 0) == pytest.approx(240, abs=1)
+    assert interval(src, None) == pytest.approx(240, abs=1)
+    assert interval(src, 0) == pytest.approx(480, abs=1)
+    assert interval(src, 0) == pytest.approx(600, abs=1)
+    assert interval(src, 3) == pytest.approx(60, abs=1)
+
+
+def test_freshness_stretches_one_interval(tmp_path):
+    src = source(tmp_path, min_poll_seconds=60, max_poll_seconds=600, poll_jitter=0)
+    src._freshness = 300
+    assert interval(src, 1) == pytest.approx(300, abs=1)
+    assert interval(src, 1) == pytest.approx(60, abs=1)
+    src._freshness = 3600
+    assert interval(src, 1) == pytest.approx(600, abs=1)
+
+
+def test_jitter_stays_within_the_range(tmp_path):
+    src = source(tmp_path, min_poll_seconds=60, max_poll_seconds=600, poll_jitter=0.5)
+    for _ in range(50):
+        assert 60 - 1 <= interval(src, 1) <= 90 + 1
+
+
+def test_check_version(tmp_path):
+    src = source(tmp_path)
+    assert src.check_version("incident-1", "u1") == "new"
+    assert src.check_version("incident-1", "u1") is None
+    assert src.check_version("incident-1", "u2") == "changed"
+    assert src.check_version("incident-1", "u2") is None
+
+
+def test_check_version_adopts_items_seen_before_versions(tmp_path):
+    src = source(tmp_path)
+    src.seen.mark_seen(src.bucket, "incident-1")
+    assert src.check_version("incident-1", "u1") is None
+    assert src.check_version("incident-1", "u2") == "changed"
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from util.timeseries import RollingSeries  # noqa: E402
+
+
+def test_aggregates_over_the_window():
+    series = RollingSeries(["wind", "temp"])
+    for i, wind in enumerate([5.0, 7.0, None, 3.0]):
+        series.append(1000 + 60 * i, {"wind": wind, "temp": 60.0 + i})
+    now = 1000 + 180
+    assert series.aggregate("wind", "max", 600, now) == 7.0
+    assert series.aggregate("wind", "count", 600, now) == 3.0
+    assert series.aggregate("wind", "mean", 600, now) == pytest.approx(5.0)
+    assert series.aggregate("wind", "last", 600, now) == 3.0
+    assert series.aggregate("wind", "max", 30, now) == 3.0
+    assert series.aggregate("wind", "max", 30, now + 3600) is None
+
+
+def test_rate_is_the_hourly_slope():
+    series = RollingSeries(["temp"])
+    for i in range(7):
+        series.append(600 * i, {"temp": 50.0 + i})
+    assert series.aggregate("temp", "rate", 3600, 3600) == pytest.approx(6.0)
+    # two readings a second apart are too short a span for a trend
+    short = RollingSeries(["temp"])
+    short.append(0, {"temp": 50.0})
+    short.append(1, {"temp": 51.0})
+    assert short.aggregate("temp", "rate", 3600, 1) is None
+
+
+def test_capacity_overwrites_the_oldest():
+    series = RollingSeries(["wind"], capacity=3)
+    for i in range(5):
+        series.append(i, {"wind": float(i)})
+    assert series.size == 3
+    assert series.aggregate("wind", "min", 100, 4) == 2.0
+
+
+def test_unknown_aggregate_is_rejected():
+    series = RollingSeries(["wind"])
+    series.append(0, {"wind": 1.0})
+    with pytest.raises(ValueError):
+        series.aggregate("wind", "median", 60, 0)
+
+
+def test_aggregates_skip_empty_windows():
+    series = RollingSeries(["wind"])
+    series.append(0, {"wind": 12.345})
+    specs = {
+        "peak": {"metric": "wind", "agg": "max", "window_minutes": 10},
+        "old": {"metric": "wind", "agg": "max", "window_minutes": 1},
+    }
+    assert series.aggregates(specs, now=120) == {"peak": 12.35}
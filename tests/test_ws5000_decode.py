@@ -0,0 +1,65 @@
+import random
+from urllib.parse import urlencode
+
+import pytest
+
+from util.ws5000_decode import WS5000Decoder
+
+
+def query(rng):
+    return urlencode(
+        {
+            "PASSKEY": "0123456789ABCDEF",
+            "stationtype": "AMBWeatherPro_V5.1.6",
+            "dateutc": "2026-10-17 15:00:00",
+            "tempf": f"{rng.uniform(50, 80):.1f}",
+            "humidity": rng.randint(30, 95),
+            "winddir": rng.randint(0, 359),
+            "windspeedmph": f"{rng.uniform(0, 15):.1f}",
+            "windgustmph": f"{rng.uniform(0, 25):.1f}",
+            "baromrelin": f"{rng.uniform(29.8, 30.1):.3f}",
+            "dailyrainin": "0.000",
+            "rainratein": "0.000",
+            "solarradiation": f"{rng.uniform(0, 800):.2f}",
+            "uv": rng.randint(0, 8),
+        }
+    )
+
+
+@pytest.fixture
+def decoder():
+    return WS5000Decoder({}, lambda dt: str(dt))
+
+
+def test_fast_path_agrees_with_the_robust_parser(decoder):
+    rng = random.Random(5)
+    for i in range(200):
+        raw = query(rng).encode()
+        if i % 2:
+            raw = b"/data/report/?" + raw + b"\r\n"
+        fast = decoder._fast_fields(raw)
+        assert fast is not None
+        assert fast == decoder._parse_fields_robust(raw)
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b"tempf=70.1;humidity=40",
+        b"GET /data?tempf=70.1&humidity=40 HTTP/1.1\r\nHost: x\r\n",
+        "tempf=70.1&stationtype=caf\xe9".encode("latin-1"),
+        b"tempf=70%252E1",
+        b"no fields here",
+    ],
+)
+def test_irregular_payloads_take_the_robust_path(decoder, raw):
+    assert decoder._fast_fields(raw) is None
+    assert decoder.parse_fields(raw) == decoder._parse_fields_robust(raw)
+
+
+def test_measurements(decoder):
+    fields = decoder.parse_fields(b"tempf=70.1&windspeedmph=3.4&windgustmph=&humidity=40")
+    values = decoder.measurements(fields)
+    assert values["temperature_F"] == pytest.approx(70.1)
+    assert values["wind_mph"] == pytest.approx(3.4)
+    assert values["wind_gust_mph"] is None